@@ -247,27 +247,48 @@ class ProbabilisticAgent(Agent):
         super().__init__(belief)
 
 
+    @staticmethod
+    def product(beliefs1, beliefs2):
+        """
+        The product operator from (Lee et al. 2018), applied element-wise to beliefs
+        or to arrays of beliefs. Where one belief is certainly true and the other
+        certainly false, the result is 0/0 and so is NaN.
+        """
+
+        beliefs1 = np.asarray(beliefs1, float)
+        beliefs2 = np.asarray(beliefs2, float)
+        product = beliefs1 * beliefs2
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return product / (product + (1.0 - beliefs1) * (1.0 - beliefs2))
+
+
+    @staticmethod
+    def fuse(beliefs1, beliefs2):
+        """
+        The product operator, applied element-wise to beliefs or to (pairs x states)
+        arrays of beliefs. Where the beliefs are in total conflict about a
+        proposition, i.e., the product operator is 0/0, the first (prior) belief
+        about that proposition is kept.
+        """
+
+        product = ProbabilisticAgent.product(beliefs1, beliefs2)
+
+        return np.where(np.isnan(product), np.asarray(beliefs1, float), product)
+
+
     @staticmethod
     def consensus(belief1, belief2):
         """
         Probabilistic updating using the product operator. This combines two (possibly conflicting)
         probability distributions into a single probability distribution.
         Bayesian updating of each independent variable based on evidence.
+
+        Propositions about which the beliefs are in total conflict keep the prior belief.
         """
 
         # Combine the belief matrices using the product operator from (Lee et al. 2018)
-        new_belief = np.array([
-            (belief1[i] * belief2[i]) /
-            (belief1[i] * belief2[i] + (1.0 - belief1[i]) * (1.0 - belief2[i]))
-            for i in range(len(belief1))
-        ])
-
-        invalid_belief = np.isnan(np.sum(new_belief))
-
-        if not invalid_belief:
-            return new_belief
-        else:
-            return None
+        return ProbabilisticAgent.fuse(belief1, belief2)
 
 
     def evidential_updating(self, true_state, noise_value, random_instance):
@@ -341,38 +362,34 @@ class DampenedAgent(ProbabilisticAgent):
 
 
     @staticmethod
-    def consensus(belief1, belief2):
+    def fuse(beliefs1, beliefs2):
         """
-        A dampened variant of the probabilistic .
-        In this variant, the variable lambda is used to prevent agents from
-        reaching absolute certainty.
+        The product operator, dampened towards 0.5, applied element-wise to beliefs
+        or to arrays of beliefs. As for ProbabilisticAgent, the prior belief is
+        kept about any proposition on which the beliefs are in total conflict.
         """
 
-        # Combine the belief matrices by flipping a coin for any states on
-        # which the two beliefs disagree, and adopting the rest.
-        new_belief = np.array([
-            (belief1[i] * belief2[i]) /
-            (belief1[i] * belief2[i] + (1.0 - belief1[i]) * (1.0 - belief2[i]))
-            for i in range(len(belief1))
-        ])
-
-        # print("Before:", new_belief)
-
         # Jonathan's preferred lambda value
         var_lambda = 0.01
-        new_belief = np.array([
-            (var_lambda * 0.5) + ((1 - var_lambda) * belief)
-            for belief in new_belief
-        ])
 
-        # print("After:", new_belief)
+        product = ProbabilisticAgent.product(beliefs1, beliefs2)
 
-        invalid_belief = np.isnan(np.sum(new_belief))
+        return np.where(
+            np.isnan(product),
+            np.asarray(beliefs1, float),
+            (var_lambda * 0.5) + ((1 - var_lambda) * product)
+        )
 
-        if not invalid_belief:
-            return new_belief
-        else:
-            return None
+
+    @staticmethod
+    def consensus(belief1, belief2):
+        """
+        A dampened variant of the probabilistic .
+        In this variant, the variable lambda is used to prevent agents from
+        reaching absolute certainty.
+        """
+
+        return DampenedAgent.fuse(belief1, belief2)
 
 
 class AverageAgent(ProbabilisticAgent):
@@ -385,6 +402,13 @@ class AverageAgent(ProbabilisticAgent):
         super().__init__(belief)
 
 
+    @staticmethod
+    def fuse(beliefs1, beliefs2):
+        """ The element-wise mean of beliefs or of arrays of beliefs. """
+
+        return (np.asarray(beliefs1, float) + np.asarray(beliefs2, float)) / 2.0
+
+
     @staticmethod
     def consensus(belief1, belief2):
         """
@@ -393,18 +417,7 @@ class AverageAgent(ProbabilisticAgent):
         reaching absolute certainty.
         """
 
-        # Combine the belief matrices by flipping a coin for any states on
-        # which the two beliefs disagree, and adopting the rest.
-        new_belief = np.array([
-            (belief1[i] + belief2[i]) / 2.0 for i in range(len(belief1))
-        ])
-
-        invalid_belief = np.isnan(np.sum(new_belief))
-
-        if not invalid_belief:
-            return new_belief
-        else:
-            return None
+        return AverageAgent.fuse(belief1, belief2)
 
 
 class ErrorCorrectingAgent(Agent):
@@ -521,7 +534,7 @@ class CautiousAdventurousAgent(Agent):
             random_instance
         )
 
-        new_belief = super().consensus(self.belief, evidence)
+        new_belief = Agent.consensus(self.belief, evidence)
 
         # Track the number of iterations.
         if np.array_equal(self.belief, new_belief):
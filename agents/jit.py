@@ -0,0 +1,246 @@
+# An optional backend for the population engine, in which a whole iteration of
+# evidence and fusion is compiled with Numba in nopython mode. Agent types whose
+# operators draw random numbers per pair or per proposition (VoterAgent,
+# StochasticAgent, CautiousAdventurousAgent) cannot be fully vectorised, so for
+# small populations a compiled loop over agents takes microseconds per iteration
+# rather than the overhead of many small NumPy operations.
+#
+# Numba is not a requirement: if it is not installed, `available` is False and
+# the NumPy population engine should be used instead.
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+available = numba is not None
+
+# Codes for the agent types and update types within compiled code.
+agent_codes = {
+    "Agent": 0, "ErrorCorrectingAgent": 1, "StochasticAgent": 2,
+    "CautiousAdventurousAgent": 3, "VoterAgent": 4
+}
+update_codes = {"Symmetric": 0, "Asymmetric": 1, "Local": 2}
+
+
+def jit(function):
+    """ Compile a function in nopython mode, if Numba is installed. """
+
+    if numba is None:
+        return function
+
+    return numba.njit(cache=True)(function)
+
+
+@jit
+def seed(value):
+    """ Seed the random number generator used within compiled code. """
+
+    np.random.seed(value)
+
+
+@jit
+def settle(since_change, agent, changed, threshold):
+    """
+    Count another update for an agent, resetting the number of iterations for
+    which its belief has remained unchanged if `changed`. Returns the change in
+    the number of agents yet to reach a steady state.
+    """
+
+    unsettled = since_change[agent] < threshold
+    if changed:
+        since_change[agent] = 0
+    else:
+        since_change[agent] += 1
+
+    return int(since_change[agent] < threshold) - int(unsettled)
+
+
+@jit
+def fuse(kind, belief1, belief2, out):
+    """ The consensus of two beliefs under the operator of the agent type `kind`. """
+
+    # StochasticAgent and CautiousAdventurousAgent toss one coin per pair.
+    cautious = False
+    if kind == 2 or kind == 3:
+        cautious = np.random.random() < 0.5
+
+    for s in range(len(out)):
+        x = belief1[s]
+        y = belief2[s]
+        if kind == 1:
+            # Upon conflict between two certain truth values, become uncertain.
+            out[s] = 0 if x != y and x != 0 and y != 0 else x
+        elif kind == 4:
+            # Flip a coin for any states on which the two beliefs disagree.
+            out[s] = x if x == y else np.random.randint(0, 2)
+        elif cautious:
+            out[s] = x if x == y else 0
+        else:
+            out[s] = max(-1, min(1, x + y))
+
+
+@jit
+def adopt(beliefs, differences, since_change, interactions, true_state, agent, new, threshold):
+    """
+    Replace an agent's belief after fusion. Returns the change in the number of
+    agents yet to reach a steady state, and whether the belief changed.
+    """
+
+    changed = False
+    difference = 0
+    for s in range(len(new)):
+        if beliefs[agent, s] != new[s]:
+            changed = True
+            difference += abs(new[s] - true_state[s]) - abs(beliefs[agent, s] - true_state[s])
+            beliefs[agent, s] = new[s]
+
+    differences[agent] += difference
+    interactions[agent] += 1
+
+    return settle(since_change, agent, changed, threshold), changed
+
+
+@jit
+def step(
+    beliefs, differences, evidence, interactions, since_change, true_state,
+    unsettled, threshold, kind, update, evidence_rate, noise_value, fusion_prob,
+    num_of_edges, evidence_only, edges, members, offsets, sizes, labels, indptr, indices
+):
+    """
+    One iteration of the population engine: evidential updating for every agent,
+    then, unless every agent has reached a steady state, belief fusion. The arrays
+    are those of a Population, and of the network's ComponentIndex and Adjacency.
+
+    Returns whether the test should continue, the new number of agents yet to
+    reach a steady state, and the number of belief changes.
+    """
+
+    num_of_agents, states = beliefs.shape
+    changes = 0
+
+    for a in range(num_of_agents):
+        if np.random.random() > evidence_rate:
+            continue
+        evidence[a] += 1
+
+        if kind == 4:
+            # Evidence about any proposition, which VoterAgent applies to its belief
+            # in place, so that its since_change counter never sees the change.
+            choice = np.random.randint(0, states)
+            truth = true_state[choice]
+            value = truth if np.random.random() > noise_value else 1 - truth
+            if value != beliefs[a, choice]:
+                differences[a] += abs(value - truth) - abs(beliefs[a, choice] - truth)
+                beliefs[a, choice] = value
+                changes += 1
+            unsettled += settle(since_change, a, False, threshold)
+            continue
+
+        # Evidence about one uncertain proposition, chosen uniformly.
+        count = 0
+        for s in range(states):
+            if beliefs[a, s] == 0:
+                count += 1
+
+        changed = False
+        if count > 0:
+            rank = np.random.randint(0, count)
+            choice = 0
+            for s in range(states):
+                if beliefs[a, s] == 0:
+                    if rank == 0:
+                        choice = s
+                        break
+                    rank -= 1
+
+            truth = true_state[choice]
+            value = truth if np.random.random() > noise_value else -truth
+            if value != 0:
+                beliefs[a, choice] = value
+                differences[a] += abs(value - truth) - abs(truth)
+                changed = True
+                changes += 1
+
+        unsettled += settle(since_change, a, changed, threshold)
+
+    if unsettled == 0:
+        return False, unsettled, changes
+    if evidence_only:
+        return True, unsettled, changes
+
+    new = np.empty(states, np.int8)
+    second = np.empty(states, np.int8)
+
+    if update == 0:
+        # A random matching: scan the edges in a lazily shuffled order, keeping
+        # each edge whose agents have not yet been chosen.
+        used = np.zeros(num_of_agents, np.bool_)
+        order = np.arange(len(edges))
+        selected = 0
+        for i in range(len(edges)):
+            if selected == num_of_edges:
+                break
+            j = i + np.random.randint(0, len(edges) - i)
+            order[i], order[j] = order[j], order[i]
+
+            x = edges[order[i], 0]
+            y = edges[order[i], 1]
+            if used[x] or used[y]:
+                continue
+            used[x] = True
+            used[y] = True
+            selected += 1
+
+            fuse(kind, beliefs[x], beliefs[y], new)
+            if kind == 1:
+                # The second agent fuses with the first agent's updated belief.
+                fuse(kind, beliefs[y], new, second)
+            else:
+                # Otherwise symmetric, so both agents adopt the combination belief.
+                second[:] = new
+
+            settled, changed = adopt(
+                beliefs, differences, since_change, interactions, true_state, x, new, threshold
+            )
+            unsettled += settled
+            changes += changed
+            settled, changed = adopt(
+                beliefs, differences, since_change, interactions, true_state, y, second, threshold
+            )
+            unsettled += settled
+            changes += changed
+
+    else:
+        # Every listener hears a broadcaster's belief from before this round of
+        # fusion, so all new beliefs are found before any is adopted.
+        listeners = np.empty(num_of_agents, np.int64)
+        count = 0
+        new_beliefs = np.empty((num_of_agents, states), np.int8)
+        for a in range(num_of_agents):
+            if np.random.random() >= fusion_prob:
+                continue
+            if update == 1:
+                label = labels[a]
+                broadcaster = members[offsets[label] + np.random.randint(0, sizes[label])]
+            else:
+                degree = indptr[a + 1] - indptr[a]
+                if degree == 0:
+                    continue
+                broadcaster = indices[indptr[a] + np.random.randint(0, degree)]
+
+            fuse(kind, beliefs[a], beliefs[broadcaster], new_beliefs[count])
+            listeners[count] = a
+            count += 1
+
+        for i in range(count):
+            settled, changed = adopt(
+                beliefs, differences, since_change, interactions, true_state,
+                listeners[i], new_beliefs[i], threshold
+            )
+            unsettled += settled
+            changes += changed
+
+    return True, unsettled, changes
@@ -0,0 +1,225 @@
+import numpy as np
+
+from agents.population import Population, population_types
+
+# Three-valued beliefs are packed into two bit-planes of uint64 words: a "known"
+# plane, set for propositions that are certain, and a "value" plane, set for
+# those that are certainly true. The value bit of an uncertain proposition is
+# always clear, so that equal beliefs have equal words.
+KNOWN = 0
+VALUE = 1
+
+# The number of set bits in each possible byte, for counting bits in words.
+byte_counts = np.array([bin(x).count("1") for x in range(256)], np.uint8)
+
+
+def popcount(words):
+    """ The number of set bits in each uint64 word. """
+
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+
+    counts = byte_counts[words.view(np.uint8)]
+    return counts.reshape(words.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def pack(beliefs):
+    """
+    Pack an (agents x states) array of three-valued beliefs in {-1, 0, 1} into an
+    (agents x 2 x words) array of bit-planes.
+    """
+
+    beliefs = np.atleast_2d(beliefs)
+    words = -(-beliefs.shape[1] // 64)
+    padding = ((0, 0), (0, words * 64 - beliefs.shape[1]))
+
+    planes = [np.pad(beliefs != 0, padding), np.pad(beliefs == 1, padding)]
+    return np.stack([
+        np.packbits(plane, axis=1, bitorder="little").view("<u8") for plane in planes
+    ], axis=1)
+
+
+def clip_add(packed1, packed2):
+    """
+    Agent.consensus on bit-planes: certain truth values are adopted from either
+    belief, unless the two beliefs conflict, in which case the result is uncertain.
+    """
+
+    known1, value1 = packed1[:, KNOWN], packed1[:, VALUE]
+    known2, value2 = packed2[:, KNOWN], packed2[:, VALUE]
+
+    agree = known1 & known2 & ~(value1 ^ value2)
+    only1 = known1 & ~known2
+    only2 = known2 & ~known1
+
+    return np.stack([
+        agree | only1 | only2,
+        (value1 & (agree | only1)) | (value2 & only2)
+    ], axis=1)
+
+
+def error_correcting(packed1, packed2):
+    """
+    ErrorCorrectingAgent.consensus on bit-planes: the first belief becomes uncertain
+    wherever it conflicts with a certain truth value of the second belief.
+    """
+
+    known1, value1 = packed1[:, KNOWN], packed1[:, VALUE]
+    conflict = known1 & packed2[:, KNOWN] & (value1 ^ packed2[:, VALUE])
+
+    return np.stack([known1 & ~conflict, value1 & ~conflict], axis=1)
+
+
+def cautious(packed1, packed2):
+    """
+    The cautious operator of CautiousAdventurousAgent on bit-planes: only truth
+    values on which the two beliefs agree remain certain.
+    """
+
+    agree = packed1[:, KNOWN] & packed2[:, KNOWN] & ~(packed1[:, VALUE] ^ packed2[:, VALUE])
+
+    return np.stack([agree, packed1[:, VALUE] & agree], axis=1)
+
+
+class PackedPopulation(Population):
+    """
+    A population of three-valued agents whose beliefs are stored as bit-planes,
+    using 2 bits per proposition, so that fusion is a handful of bitwise operations
+    per 64 propositions and loss is a count of bits.
+
+    The true state is packed in the same way, so that a true value of 0, as drawn
+    for StochasticAgent and CautiousAdventurousAgent, is an uncertain proposition.
+    """
+
+    def __init__(self, agent_type, num_of_agents, states, true_state, threshold = 1):
+
+        if agent_type.__name__ not in [
+            "Agent", "ErrorCorrectingAgent", "StochasticAgent", "CautiousAdventurousAgent"
+        ]:
+            raise ValueError(
+                "No packed population engine for agent type: {}".format(agent_type.__name__)
+            )
+
+        self.agent_type = agent_type
+        self.scale = population_types[agent_type.__name__]
+        self.states = states
+        self.initialise_counters(num_of_agents, threshold)
+
+        self.beliefs = pack(np.zeros((num_of_agents, states), np.int8))
+        self.true_state = pack(true_state)[0]
+
+        # The bits of the final word that do not correspond to any proposition.
+        self.valid = pack(np.ones(states, np.int8))[0, KNOWN]
+
+
+    def consensus(self, beliefs1, beliefs2, rng = None):
+        """
+        Row-wise consensus of two packed belief arrays under the agent type's operator.
+        The stochastic operators draw one coin for each pair of beliefs from the
+        numpy Generator `rng`, as in Population.consensus.
+        """
+
+        name = self.agent_type.__name__
+
+        if name == "ErrorCorrectingAgent":
+            return error_correcting(beliefs1, beliefs2)
+
+        if name in ["StochasticAgent", "CautiousAdventurousAgent"]:
+            # With a 50:50 chance, only truth values on which both beliefs agree
+            # remain certain.
+            coins = rng.random(len(beliefs1)) < 0.5
+            return np.where(
+                coins[:, None, None], cautious(beliefs1, beliefs2), clip_add(beliefs1, beliefs2)
+            )
+
+        return clip_add(beliefs1, beliefs2)
+
+
+    def evidential_updating(self, receiving, noise_value, rng):
+        """
+        Give a piece of evidence about one uncertain proposition to every agent in
+        the boolean mask `receiving`. Agents without any uncertain propositions
+        receive no information, and so their beliefs are unchanged, as do agents
+        receiving evidence about a proposition whose true value is 0.
+        """
+
+        agents = np.flatnonzero(receiving)
+        if len(agents) == 0:
+            return
+
+        unknowns = ~self.beliefs[agents, KNOWN] & self.valid
+        word_counts = popcount(unknowns).astype(np.int64)
+        cumulative_counts = np.cumsum(word_counts, axis=1)
+        counts = cumulative_counts[:, -1]
+        learning = counts > 0
+
+        # Pick a random rank among each agent's unknowns, then find the word holding
+        # that rank and the bit within the word.
+        ranks = (rng.random(len(agents)) * counts).astype(np.int64)
+        flips = rng.random(len(agents)) <= noise_value
+
+        agents, ranks, flips = agents[learning], ranks[learning], flips[learning]
+        unknowns = unknowns[learning]
+        cumulative_counts = cumulative_counts[learning]
+        word_counts = word_counts[learning]
+
+        rows = np.arange(len(agents))
+        words = np.argmax(cumulative_counts > ranks[:, None], axis=1)
+        ranks -= cumulative_counts[rows, words] - word_counts[rows, words]
+
+        bits = np.unpackbits(
+            unknowns[rows, words].astype("<u8").view(np.uint8).reshape(-1, 8),
+            axis=1, bitorder="little"
+        )
+        bits = np.argmax(np.cumsum(bits, axis=1) > ranks[:, None], axis=1)
+        masks = np.left_shift(np.uint64(1), bits.astype(np.uint64))
+
+        # The evidence is true to the world unless flipped by noise. Evidence
+        # that a proposition's true value is 0 leaves the belief uncertain.
+        informative = (self.true_state[KNOWN, words] & masks) != 0
+        agents, words, masks = agents[informative], words[informative], masks[informative]
+        truths = (self.true_state[VALUE, words] & masks) != 0
+        values = np.where(truths ^ flips[informative], masks, np.uint64(0))
+
+        self.beliefs[agents, KNOWN, words] |= masks
+        self.beliefs[agents, VALUE, words] |= values
+
+        receivers = np.flatnonzero(receiving)
+        self.track_changes(receivers, np.isin(receivers, agents))
+        self.evidence[receivers] += 1
+
+
+    def update_beliefs(self, agents, new_beliefs):
+        """
+        Replace the beliefs of the given agents after fusion, tracking the number
+        of iterations for which each agent's belief has remained unchanged.
+        """
+
+        unchanged = np.all(self.beliefs[agents] == new_beliefs, axis=(1, 2))
+        self.track_changes(agents, ~unchanged)
+        self.beliefs[agents] = new_beliefs
+        self.interactions[agents] += 1
+
+
+    def loss(self, normalised = True):
+        """
+        The loss of every agent's belief against the true state of the world,
+        matching results.loss.
+        """
+
+        def count(words):
+            return popcount(words).sum(axis=1, dtype=np.int64)
+
+        # Wrong certain truth values differ from the truth by 2, and uncertain
+        # propositions that are certain in truth, or the reverse, by 1.
+        known = self.beliefs[:, KNOWN]
+        true_known = self.true_state[KNOWN]
+        errors = known & true_known & (self.beliefs[:, VALUE] ^ self.true_state[VALUE])
+        differences = self.scale * (
+            2 * count(errors) + count(~known & true_known) + count(known & ~true_known)
+        )
+
+        if normalised:
+            return differences / self.states
+
+        return differences
@@ -0,0 +1,507 @@
+import numpy as np
+
+def random_evidence(beliefs, receiving, true_state, noise_value, rng):
+    """
+    Give every agent in the boolean mask `receiving` a piece of evidence about one
+    uncertain proposition of its row of the (agents x states) belief matrix, in
+    place. The proposition is chosen uniformly by drawing a random key for each
+    proposition and taking the largest key among the agent's unknowns, and the
+    evidence is flipped with probability `noise_value`. The true state is either a
+    single vector, or a matrix with a row for each agent.
+
+    Returns the updated belief matrix, the agents that learned something (those
+    with any uncertain propositions), and the propositions that they learned about.
+    """
+
+    agents = np.flatnonzero(receiving)
+
+    keys = rng.random((len(agents), beliefs.shape[1]))
+    keys[beliefs[agents] != 0] = -1.0
+    choices = np.argmax(keys, axis=1)
+    learning = keys[np.arange(len(agents)), choices] >= 0.0
+
+    agents, choices = agents[learning], choices[learning]
+    flips = rng.random(len(agents)) <= noise_value
+    truths = true_state[agents, choices] if true_state.ndim == 2 else true_state[choices]
+    values = np.where(flips, -truths, truths)
+
+    # Any chosen proposition is uncertain, so the evidence is adopted directly.
+    beliefs[agents, choices] = values
+
+    return beliefs, agents, choices
+
+
+# The agent types with a population engine, and the scale of their loss, as in
+# results.loss: the differences of some three-valued agent types count for half.
+population_types = {
+    "Agent": 0.5, "ErrorCorrectingAgent": 0.5, "StochasticAgent": 0.5,
+    "CautiousAdventurousAgent": 1.0, "VoterAgent": 1.0
+}
+
+
+class Population:
+    """
+    A population of three-valued (or voter) agents stored as a single (agents x
+    states) belief matrix, so that evidence and fusion are applied to every agent
+    at once.
+
+    The loss of each agent against the true state of the world is maintained as
+    beliefs change, rather than being recomputed for every agent each iteration.
+    Likewise, the number of agents yet to reach a steady state under `threshold`
+    is maintained, so that checking for convergence takes constant time.
+    """
+
+    def __init__(
+        self, agent_type, num_of_agents, states, true_state, threshold = 1, beliefs = None
+    ):
+
+        if agent_type.__name__ not in population_types:
+            raise ValueError(
+                "No population engine for agent type: {}".format(agent_type.__name__)
+            )
+
+        self.agent_type = agent_type
+        self.scale = population_types[agent_type.__name__]
+        if beliefs is None:
+            self.beliefs = np.zeros((num_of_agents, states), np.int8)
+        else:
+            self.beliefs = np.array(beliefs, np.int8)
+        self.initialise_counters(num_of_agents, threshold)
+
+        # The sum of the differences between each agent's belief and the true state.
+        self.true_state = np.asarray(true_state, np.int8)
+        self.differences = np.abs(self.beliefs - self.true_state).sum(axis=1).astype(np.int32)
+
+
+    def __len__(self):
+        return len(self.beliefs)
+
+
+    def agent(self, index):
+        """ An AgentView of the agent at the given index. """
+
+        return AgentView(self, index)
+
+
+    def agents(self):
+        """ An AgentView of every agent, in order of index. """
+
+        return [AgentView(self, index) for index in range(len(self))]
+
+
+    def initialise_counters(self, num_of_agents, threshold):
+        """ Initialise the per-agent counters and the steady-state tracking. """
+
+        self.evidence = np.zeros(num_of_agents, np.int32)
+        self.interactions = np.zeros(num_of_agents, np.int32)
+        self.since_change = np.zeros(num_of_agents, np.int32)
+
+        self.threshold = threshold
+        self.unsettled = num_of_agents if threshold > 0 else 0
+        # The number of belief changes since this was last reset.
+        self.changes = 0
+
+
+    def track_changes(self, agents, changed):
+        """
+        Count another update for each of the given agents, resetting the number
+        of iterations for which its belief has remained unchanged if `changed`.
+        """
+
+        since_change = self.since_change[agents]
+        unsettled = np.count_nonzero(since_change < self.threshold)
+
+        since_change = np.where(changed, 0, since_change + 1)
+        self.since_change[agents] = since_change
+
+        self.unsettled += np.count_nonzero(since_change < self.threshold) - unsettled
+        self.changes += np.count_nonzero(changed)
+
+
+    def note_changes(self, agents):
+        """ Count changes to the beliefs of the given agents made outside of track_changes(). """
+
+        self.changes += np.size(agents)
+
+
+    def steady_state(self):
+        """ Check if every agent has reached a steady state. """
+
+        return self.unsettled == 0
+
+
+    def true_rows(self, agents):
+        """ The true state against which each of the given agents is measured. """
+
+        return self.true_state
+
+
+    def truths(self, agents, propositions):
+        """ The true value of one proposition for each of the given agents. """
+
+        return self.true_state[propositions]
+
+
+    def consensus(self, beliefs1, beliefs2, rng = None):
+        """
+        Row-wise consensus of two belief matrices under the agent type's operator.
+        The stochastic operators draw from the numpy Generator `rng`: one coin for
+        each pair of beliefs, or for voter agents, one for each contested state.
+        """
+
+        name = self.agent_type.__name__
+
+        if name == "ErrorCorrectingAgent":
+            # Upon conflict between two certain truth values, become uncertain.
+            conflict = (beliefs1 != beliefs2) & (beliefs1 != 0) & (beliefs2 != 0)
+            return np.where(conflict, 0, beliefs1).astype(np.int8)
+
+        if name == "VoterAgent":
+            # Flip a coin for any states on which the two beliefs disagree.
+            coins = rng.integers(0, 2, beliefs1.shape, np.int8)
+            return np.where(beliefs1 == beliefs2, beliefs1, coins).astype(np.int8)
+
+        # Combine the belief matrices and then clip them to be in
+        # the set of possible values: {-1,0,1}
+        combined = np.clip(beliefs1 + beliefs2, -1, 1).astype(np.int8)
+
+        if name in ["StochasticAgent", "CautiousAdventurousAgent"]:
+            # With a 50:50 chance, only truth values on which both beliefs agree
+            # remain certain.
+            cautious = np.where(beliefs1 == beliefs2, beliefs1, 0).astype(np.int8)
+            coins = rng.random(len(beliefs1)) < 0.5
+            return np.where(coins[:, None], cautious, combined)
+
+        return combined
+
+
+    def evidential_updating(self, receiving, noise_value, rng):
+        """
+        Give a piece of evidence about one uncertain proposition to every agent in
+        the boolean mask `receiving`. Agents without any uncertain propositions
+        receive no information, and so their beliefs are unchanged. Voter agents
+        instead receive evidence about any proposition.
+        """
+
+        agents = np.flatnonzero(receiving)
+        if len(agents) == 0:
+            return
+
+        if self.agent_type.__name__ == "VoterAgent":
+            choices = (rng.random(len(agents)) * self.beliefs.shape[1]).astype(np.int64)
+            flips = rng.random(len(agents)) <= noise_value
+            truths = self.truths(agents, choices)
+            values = np.where(flips, 1 - truths, truths).astype(np.int8)
+
+            old_values = self.beliefs[agents, choices]
+            self.beliefs[agents, choices] = values
+            self.differences[agents] += np.abs(values - truths) - np.abs(old_values - truths)
+
+            # VoterAgent.evidential_updating changes the belief in place, so that
+            # evidence never resets its since_change counter.
+            self.track_changes(agents, np.zeros(len(agents), dtype=bool))
+            self.note_changes(agents[values != old_values])
+            self.evidence[agents] += 1
+            return
+
+        self.beliefs, learners, choices = random_evidence(
+            self.beliefs, receiving, self.true_state, noise_value, rng
+        )
+
+        # Each learned proposition was uncertain, so the agent's difference on it
+        # moves from the magnitude of the truth value to that of the error. Evidence
+        # about a proposition whose truth value is 0 leaves the belief unchanged.
+        values = self.beliefs[learners, choices]
+        truths = self.truths(learners, choices)
+        self.differences[learners] += np.abs(values - truths) - np.abs(truths)
+
+        self.track_changes(agents, np.isin(agents, learners[values != 0]))
+        self.evidence[agents] += 1
+
+
+    def update_beliefs(self, agents, new_beliefs):
+        """
+        Replace the beliefs of the given agents after fusion, tracking the number
+        of iterations for which each agent's belief has remained unchanged.
+        """
+
+        old_beliefs = self.beliefs[agents]
+        unchanged = np.all(old_beliefs == new_beliefs, axis=1)
+        self.track_changes(agents, ~unchanged)
+
+        # Only the differences of agents whose beliefs changed need updating.
+        changed = ~unchanged
+        true_state = self.true_rows(agents[changed])
+        self.differences[agents[changed]] += (
+            np.abs(new_beliefs[changed] - true_state).sum(axis=1)
+            - np.abs(old_beliefs[changed] - true_state).sum(axis=1)
+        ).astype(np.int32)
+
+        self.beliefs[agents] = new_beliefs
+        self.interactions[agents] += 1
+
+
+    def loss(self, normalised = True):
+        """
+        The loss of every agent's belief against the true state of the world,
+        matching results.loss.
+        """
+
+        differences = self.differences * self.scale
+
+        if normalised:
+            return differences / self.beliefs.shape[1]
+
+        return differences
+
+
+class BatchPopulation(Population):
+    """
+    The populations of many independent tests stored as a single Population, with
+    the agents of test t in rows [t * num_of_agents, (t + 1) * num_of_agents) and
+    a true state for each test, so that one step advances every test at once.
+
+    Steady states, belief changes and losses are tracked for each test. Tests that
+    have ended are removed from the `active` mask, and callers should only pass
+    the agents of active tests to evidential_updating() and update_beliefs().
+    """
+
+    def __init__(
+        self, agent_type, tests, num_of_agents, states, true_states, threshold = 1,
+        beliefs = None
+    ):
+
+        self.tests = tests
+        self.num_of_agents = num_of_agents
+        self.active = np.ones(tests, dtype=bool)
+
+        super().__init__(
+            agent_type, tests * num_of_agents, states,
+            np.repeat(np.asarray(true_states, np.int8), num_of_agents, axis=0), threshold,
+            beliefs
+        )
+
+
+    def initialise_counters(self, num_of_agents, threshold):
+
+        super().initialise_counters(num_of_agents, threshold)
+
+        self.unsettled = np.full(self.tests, self.num_of_agents if threshold > 0 else 0)
+        self.changes = np.zeros(self.tests, np.int64)
+
+
+    def true_rows(self, agents):
+        return self.true_state[agents]
+
+
+    def truths(self, agents, propositions):
+        return self.true_state[agents, propositions]
+
+
+    def test_of(self, agents):
+        """ The test to which each of the given agents belongs. """
+
+        return agents // self.num_of_agents
+
+
+    def active_agents(self):
+        """ A boolean mask of the agents of active tests. """
+
+        return np.repeat(self.active, self.num_of_agents)
+
+
+    def track_changes(self, agents, changed):
+
+        tests = self.test_of(agents)
+        since_change = self.since_change[agents]
+        unsettled = since_change < self.threshold
+
+        since_change = np.where(changed, 0, since_change + 1)
+        self.since_change[agents] = since_change
+
+        self.unsettled += np.bincount(
+            tests, (since_change < self.threshold).astype(np.int64) - unsettled, self.tests
+        ).astype(np.int64)
+        self.changes += np.bincount(tests, changed, self.tests).astype(np.int64)
+
+
+    def note_changes(self, agents):
+        self.changes += np.bincount(self.test_of(np.atleast_1d(agents)), minlength=self.tests)
+
+
+    def steady_state(self):
+        """ Check, for each test, whether every agent has reached a steady state. """
+
+        return self.unsettled == 0
+
+
+    def loss(self, normalised = True):
+        """ The loss of every agent, as a (tests x agents) array. """
+
+        return super().loss(normalised).reshape(self.tests, self.num_of_agents)
+
+
+class AgentView:
+    """
+    A lightweight view of a single agent of a Population, so that code written
+    against the Agent API (consensus, evidential_updating, update_belief and so
+    on) works on the population's arrays. The agent's belief is a row of the
+    belief matrix, its counters are entries of the population's counter arrays
+    and its identity is its index, so that a view holds nothing but these two
+    references and the belief it has obtained from another agent, if any.
+
+    The methods of the population's agent type are applied to the view, and
+    writes through the view keep the population's loss and steady-state tracking
+    up to date, including edits made to the belief row in place, e.g., by
+    VoterAgent, once the belief is assigned.
+    """
+
+    __slots__ = ("population", "index", "obtained_belief")
+
+    def __init__(self, population, index):
+
+        self.population = population
+        self.index = index
+        self.obtained_belief = None
+
+
+    def __repr__(self):
+        return "AgentView({})".format(self.index)
+
+
+    @property
+    def identity(self):
+        return self.index
+
+
+    @property
+    def belief(self):
+        return self.population.beliefs[self.index]
+
+
+    @belief.setter
+    def belief(self, new_belief):
+
+        population = self.population
+        old_belief = population.beliefs[self.index].copy()
+        population.beliefs[self.index] = new_belief
+
+        # The row may already have been edited in place, so the difference is
+        # recomputed in full. An in-place edit of a voter's belief always changes
+        # its difference, as its true values and beliefs are each 0 or 1.
+        difference = np.abs(
+            population.beliefs[self.index] - population.true_rows(self.index)
+        ).sum()
+        if difference != population.differences[self.index] or \
+            not np.array_equal(old_belief, population.beliefs[self.index]):
+            population.differences[self.index] = difference
+            population.note_changes(self.index)
+
+
+    @property
+    def evidence(self):
+        return int(self.population.evidence[self.index])
+
+
+    @evidence.setter
+    def evidence(self, value):
+        self.population.evidence[self.index] = value
+
+
+    @property
+    def interactions(self):
+        return int(self.population.interactions[self.index])
+
+
+    @interactions.setter
+    def interactions(self, value):
+        self.population.interactions[self.index] = value
+
+
+    @property
+    def since_change(self):
+        return int(self.population.since_change[self.index])
+
+
+    @since_change.setter
+    def since_change(self, value):
+
+        population = self.population
+        unsettled = int(population.since_change[self.index] < population.threshold)
+        population.since_change[self.index] = value
+        population.unsettled += int(value < population.threshold) - unsettled
+
+
+    def steady_state(self, threshold):
+        return self.population.agent_type.steady_state(self, threshold)
+
+
+    def consensus(self, *beliefs, **options):
+        return self.population.agent_type.consensus(*beliefs, **options)
+
+
+    def evidential_updating(self, true_state, noise_value, random_instance):
+        return self.population.agent_type.evidential_updating(
+            self, true_state, noise_value, random_instance
+        )
+
+
+    def update_belief(self, new_belief):
+        return self.population.agent_type.update_belief(self, new_belief)
+
+
+    def random_evidence(self, true_state, noise_value, random_instance):
+        return self.population.agent_type.random_evidence(
+            self, true_state, noise_value, random_instance
+        )
+
+
+def evidence_only_losses(
+    num_of_agents, states, evidence_rate, noise_value, threshold, iteration_limit, rng
+):
+    """
+    Directly simulate the losses of a population of three-valued agents that only
+    receive evidence, without stepping through each iteration. Every true value
+    must be -1 or 1, so that every piece of evidence about an uncertain
+    proposition reveals it, and an uncertain proposition counts as half of an error.
+
+    Each agent receives evidence in each iteration with probability `evidence_rate`,
+    so the iterations at which it does are the running sums of geometric gaps. Its
+    first `states` pieces of evidence each reveal one uncertain proposition, which is
+    wrong with probability `noise_value`, and the order in which propositions are
+    revealed does not affect its loss. Every later piece of evidence leaves its
+    belief unchanged, so the agent reaches a steady state at its (states +
+    threshold)th piece of evidence, and the population converges once all agents do.
+    With a threshold of 0, every agent is always in a steady state, so the
+    population converges at the first iteration.
+
+    Returns an (iterations x agents) array of losses, from the initial beliefs up
+    to and including the converged iteration, or the iteration limit.
+    """
+
+    if evidence_rate > 0:
+        times = np.cumsum(rng.geometric(evidence_rate, (num_of_agents, states + threshold)), axis=1)
+    else:
+        times = np.full((num_of_agents, states + threshold), iteration_limit + 1)
+    errors = rng.random((num_of_agents, states)) <= noise_value
+
+    converged = times[:, -1].max() if threshold > 0 else 1
+    last_iteration = min(converged, iteration_limit)
+
+    # Count the propositions each agent has revealed by each iteration.
+    reveals = np.zeros((num_of_agents, last_iteration + 2), np.int32)
+    np.add.at(
+        reveals,
+        (np.repeat(np.arange(num_of_agents), states), np.minimum(times[:, :states], last_iteration + 1).ravel()),
+        1
+    )
+    revealed = np.cumsum(reveals, axis=1)[:, :last_iteration + 1]
+
+    # The number of wrong propositions among the first n revealed, for each n.
+    wrong = np.concatenate(
+        (np.zeros((num_of_agents, 1), np.int32), np.cumsum(errors, axis=1, dtype=np.int32)), axis=1
+    )
+    wrong = np.take_along_axis(wrong, revealed, axis=1)
+
+    # Each uncertain proposition counts as half of an error.
+    return ((states - revealed) / 2.0 + wrong).T / states
@@ -0,0 +1,142 @@
+# Functions for recognising completed experiments, so that a sweep can skip any
+# configuration whose results have already been written, and resume after being
+# interrupted.
+
+import ast
+import glob
+import hashlib
+import json
+import lzma
+import os
+import pickle
+
+# The source files whose contents determine the results of a simulation.
+source_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+source_patterns = ["world.py", "agents/*.py", "utilities/*.py"]
+# Source files that also hold the settings of experiments, which are recorded in
+# each configuration's parameters instead.
+settings_files = ["world.py"]
+
+
+def simulation_source(path):
+    """
+    The contents of a source file that determine the results of a simulation. For
+    a settings file, this is the syntax tree of its imports, functions and classes,
+    without its module-level settings, the sweep in its `if __name__ == "__main__"`
+    block, or any comments, so that editing them does not discard cached results.
+    """
+
+    with open(path, 'rb') as file:
+        source = file.read()
+
+    if os.path.relpath(path, source_directory) not in settings_files:
+        return source
+
+    return "\n".join(
+        ast.dump(node) for node in ast.parse(source).body
+        if isinstance(node, (
+            ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef
+        ))
+    ).encode()
+
+
+def code_version():
+    """
+    A hash of the simulation source code, so that results produced by an older
+    version of the code are not mistaken for current results.
+    """
+
+    paths = sorted(
+        path for pattern in source_patterns
+        for path in glob.glob(os.path.join(source_directory, pattern))
+    )
+
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.relpath(path, source_directory).encode())
+        digest.update(simulation_source(path))
+
+    return digest.hexdigest()[:16]
+
+
+def file_hash(path):
+    """ A hash of the contents of a file. """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def configuration_key(parameters):
+    """
+    A stable hash of every parameter that affects the output of an experiment,
+    which is independent of the order in which the parameters were given.
+    """
+
+    encoded = json.dumps(parameters, sort_keys=True, default=str)
+
+    return hashlib.sha256(encoded.encode()).hexdigest()[:32]
+
+
+def write_pickle(path, data):
+    """
+    Write data to an lzma-compressed pickle file, via a temporary file, so that
+    an interrupted write never leaves a partial result file behind.
+    """
+
+    temporary_path = path + ".tmp"
+    with lzma.open(temporary_path, 'wb') as file:
+        pickle.dump(data, file)
+    os.replace(temporary_path, path)
+
+
+class ResultCache:
+    """
+    Records completed experiments as small manifest files, named by configuration
+    key, in a hidden subdirectory of the results directory. Result file names do
+    not include every parameter, so different configurations may write the same
+    files; each manifest therefore holds a hash of every result file as it was
+    written, and a configuration is only complete while its files are unchanged.
+    """
+
+    def __init__(self, directory):
+
+        self.directory = os.path.join(directory, ".cache")
+
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+
+    def complete(self, key, files):
+        """
+        Check whether the experiment has finished, having written each of the given
+        result files, and none of them has since been overwritten or removed.
+        """
+
+        try:
+            with open(self.path(key)) as file:
+                manifest = json.load(file)
+            hashes = manifest["files"]
+            return all(
+                path in hashes and file_hash(path) == hashes[path] for path in files
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+
+    def record(self, key, parameters, files):
+        """ Mark the experiment as finished once all of its result files are written. """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        temporary_path = self.path(key) + ".tmp"
+        with open(temporary_path, 'w') as file:
+            json.dump(
+                {"parameters": parameters, "files": {path: file_hash(path) for path in files}},
+                file, sort_keys=True, indent=4, default=str
+            )
+        os.replace(temporary_path, self.path(key))
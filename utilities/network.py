@@ -0,0 +1,407 @@
+# Structural indices over a fixed network, computed once per test so that the
+# main loop never has to search the graph.
+
+import os
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+
+class ComponentIndex:
+    """
+    Labels the connected components of a network once, keeping the members of
+    each component in a single array so that a random member of any node's
+    component can be chosen in constant time.
+
+    The network is given as an (E, 2) array of node indices in [0, num_of_nodes).
+    Components are labelled in order of their smallest member.
+    """
+
+    def __init__(self, edges, num_of_nodes):
+
+        self.set_labels(component_labels(edges, num_of_nodes))
+
+
+    @classmethod
+    def from_labels(cls, labels):
+        """ The ComponentIndex of a network, given every node's component label. """
+
+        index = cls.__new__(cls)
+        index.set_labels(labels)
+
+        return index
+
+
+    def set_labels(self, labels):
+        """ Index the members of each component, given every node's component label. """
+
+        self.labels = labels
+
+        # Members are stored contiguously by component label, sorted by index
+        # within each component, with each component's slice of the array
+        # starting at its offset.
+        self.members = np.argsort(self.labels, kind="stable").astype(np.int32)
+        self.sizes = np.bincount(self.labels).astype(np.int32)
+        self.offsets = np.concatenate(([0], np.cumsum(self.sizes)[:-1])).astype(np.int32)
+
+
+    def relabel(self, permutation):
+        """
+        The ComponentIndex of the same network with node i relabelled as
+        permutation[i], without searching the network again.
+        """
+
+        labels = np.empty_like(self.labels)
+        labels[permutation] = self.labels
+
+        return ComponentIndex.from_labels(labels)
+
+
+    def component(self, node):
+        """ The member indices of the component containing the given node index. """
+
+        label = self.labels[node]
+        return self.members[self.offsets[label]:self.offsets[label] + self.sizes[label]]
+
+
+    def choice(self, node, random_instance):
+        """
+        Choose a node index uniformly from the component containing the given node
+        index, using a random.Random instance.
+        """
+
+        label = self.labels[node]
+        return self.members[self.offsets[label] + random_instance.randrange(self.sizes[label])]
+
+
+    def sample(self, nodes, rng):
+        """
+        Choose, for each of an array of node indices, a node index uniformly from
+        its component, using a numpy Generator.
+        """
+
+        labels = self.labels[nodes]
+        ranks = (rng.random(len(labels)) * self.sizes[labels]).astype(np.int32)
+        return self.members[self.offsets[labels] + ranks]
+
+
+class Adjacency:
+    """
+    A compressed sparse row (CSR) adjacency of a network: the neighbours of node
+    index i are `indices[indptr[i]:indptr[i + 1]]`.
+
+    The network is given as an (E, 2) array of node indices in [0, num_of_nodes).
+    """
+
+    def __init__(self, edges, num_of_nodes):
+
+        # Each undirected edge appears once in the row of each of its endpoints.
+        sources = np.concatenate((edges[:, 0], edges[:, 1]))
+        targets = np.concatenate((edges[:, 1], edges[:, 0]))
+        order = np.argsort(sources, kind="stable")
+
+        self.degrees = np.bincount(sources, minlength=num_of_nodes).astype(np.int32)
+        self.indptr = np.concatenate(([0], np.cumsum(self.degrees))).astype(np.int64)
+        self.indices = targets[order].astype(np.int32)
+
+
+    @classmethod
+    def from_csr(cls, indptr, indices):
+        """ The Adjacency of a network, given its CSR arrays. """
+
+        adjacency = cls.__new__(cls)
+        adjacency.indptr = indptr
+        adjacency.indices = indices
+        adjacency.degrees = np.diff(indptr).astype(np.int32)
+
+        return adjacency
+
+
+    def relabel(self, permutation):
+        """
+        The Adjacency of the same network with node i relabelled as permutation[i],
+        without rebuilding it from the edges. The row of node i becomes the row of
+        permutation[i], with its neighbours relabelled in the same order, exactly
+        as if the Adjacency were built from the relabelled edges.
+        """
+
+        degrees = np.empty_like(self.degrees)
+        degrees[permutation] = self.degrees
+        indptr = np.concatenate(([0], np.cumsum(degrees))).astype(np.int64)
+
+        # The original node whose row becomes each new row, in order.
+        rows = np.empty_like(permutation)
+        rows[permutation] = np.arange(len(permutation), dtype=permutation.dtype)
+        positions = np.repeat(self.indptr[rows] - indptr[:-1], degrees)
+        positions += np.arange(len(self.indices))
+
+        return Adjacency.from_csr(
+            indptr, permutation[self.indices[positions]].astype(np.int32)
+        )
+
+
+    def neighbours(self, node):
+        """ The neighbour indices of the given node index. """
+
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+
+    def choice(self, node, random_instance):
+        """
+        Choose a neighbour index of the given node index uniformly, using a
+        random.Random instance. Returns None for an isolated node.
+        """
+
+        if self.degrees[node] == 0:
+            return None
+
+        return self.indices[self.indptr[node] + random_instance.randrange(self.degrees[node])]
+
+
+    def sample(self, nodes, rng):
+        """
+        Choose, for each of an array of node indices, a neighbour index uniformly
+        using a numpy Generator. Isolated nodes have no neighbour to choose, so
+        returns the nodes that do alongside their chosen neighbours.
+        """
+
+        nodes = nodes[self.degrees[nodes] > 0]
+        offsets = (rng.random(len(nodes)) * self.degrees[nodes]).astype(np.int64)
+
+        return nodes, self.indices[self.indptr[nodes] + offsets]
+
+
+class Topology:
+    """
+    A fixed network of `num_of_nodes` nodes, given as an (E, 2) int32 array of
+    node indices, together with its ComponentIndex and Adjacency, which are each
+    computed once, when first needed or by build_indices(), however many tests
+    share the topology.
+    """
+
+    def __init__(self, edges, num_of_nodes, components = None, adjacency = None):
+
+        self.edges = edges
+        self.num_of_nodes = num_of_nodes
+        self._components = components
+        self._adjacency = adjacency
+
+
+    def build_indices(self, adjacency = False):
+        """
+        Compute the ComponentIndex, and the Adjacency if `adjacency` is set, unless
+        they have already been computed, e.g., before a topology is shared, so that
+        its relabellings are given them too. Returns the topology.
+        """
+
+        if self._components is None:
+            self._components = ComponentIndex(self.edges, self.num_of_nodes)
+        if adjacency and self._adjacency is None:
+            self._adjacency = Adjacency(self.edges, self.num_of_nodes)
+
+        return self
+
+
+    @property
+    def components(self):
+
+        if self._components is None:
+            self._components = ComponentIndex(self.edges, self.num_of_nodes)
+
+        return self._components
+
+
+    @property
+    def adjacency(self):
+
+        if self._adjacency is None:
+            self._adjacency = Adjacency(self.edges, self.num_of_nodes)
+
+        return self._adjacency
+
+
+    def relabel(self, permutation):
+        """
+        The same topology with node i relabelled as permutation[i]. Relabelling a
+        graph by a uniformly random permutation samples uniformly from the graphs
+        isomorphic to it, e.g., a star with a uniformly random hub. Whichever of
+        the ComponentIndex and Adjacency have been computed are relabelled too.
+        """
+
+        permutation = np.asarray(permutation, np.int32)
+        components = None
+        if self._components is not None:
+            components = self._components.relabel(permutation)
+        adjacency = None
+        if self._adjacency is not None:
+            adjacency = self._adjacency.relabel(permutation)
+
+        return Topology(permutation[self.edges], self.num_of_nodes, components, adjacency)
+
+
+class TopologyCache:
+    """
+    Topologies kept for reuse across tests and configurations, keyed on everything
+    that determines them, e.g., (graph_type, agents, clique_size, generator
+    parameters, seed). The least recently used topology is discarded once more
+    than `size` are kept.
+    """
+
+    def __init__(self, size = 16):
+
+        self.size = size
+        self.topologies = OrderedDict()
+
+
+    def get(self, key, build):
+        """ The topology with the given key, calling build() to create it if need be. """
+
+        if key in self.topologies:
+            self.topologies.move_to_end(key)
+            return self.topologies[key]
+
+        topology = build()
+        self.topologies[key] = topology
+        if len(self.topologies) > self.size:
+            self.topologies.popitem(last=False)
+
+        return topology
+
+
+class TopologyStore:
+    """
+    Topologies kept on disk, one subdirectory per key, as the .npy files of the
+    edge array, the CSR adjacency (indptr and indices) and the component labels.
+    They are opened as memory maps, so that every worker process reading the same
+    graph shares a single copy of it through the page cache.
+    """
+
+    files = ["edges", "indptr", "indices", "labels"]
+
+    def __init__(self, directory):
+
+        self.directory = directory
+
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+
+    def load(self, key):
+        """ The stored topology with the given key, or None if there is none. """
+
+        path = self.path(key)
+        try:
+            arrays = {
+                name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+                for name in self.files
+            }
+        except (OSError, ValueError):
+            return None
+
+        return Topology(
+            arrays["edges"], len(arrays["labels"]),
+            ComponentIndex.from_labels(arrays["labels"]),
+            Adjacency.from_csr(arrays["indptr"], arrays["indices"])
+        )
+
+
+    def save(self, key, topology):
+        """
+        Write a topology via a temporary directory, so that a partially written
+        topology is never read, and another process may safely write the same key.
+        """
+
+        temporary_path = "{}.tmp{}".format(self.path(key), os.getpid())
+        os.makedirs(temporary_path, exist_ok=True)
+
+        arrays = {
+            "edges": topology.edges,
+            "indptr": topology.adjacency.indptr,
+            "indices": topology.adjacency.indices,
+            "labels": topology.components.labels
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(temporary_path, name + ".npy"), np.asarray(array))
+
+        try:
+            os.replace(temporary_path, self.path(key))
+        except OSError:
+            # Another process has already stored this topology.
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+
+    def get(self, key, build):
+        """
+        The stored topology with the given key, calling build() to create and
+        store it if need be.
+        """
+
+        topology = self.load(key)
+        if topology is None:
+            self.save(key, build())
+            topology = self.load(key)
+
+        return topology
+
+
+def component_labels(edges, num_of_nodes):
+    """
+    Label the connected components of an (E, 2) edge array, numbering them in
+    order of their smallest member. Each node points to a parent, starting with
+    itself: every edge hooks the larger of its endpoints' roots onto the smaller,
+    and paths are then halved until every node points to its root, which takes a
+    logarithmic number of rounds rather than one per step of the graph's diameter.
+    """
+
+    parents = np.arange(num_of_nodes, dtype=np.int64)
+    if len(edges) == 0:
+        return parents.astype(np.int32)
+
+    sources = edges[:, 0].astype(np.int64)
+    targets = edges[:, 1].astype(np.int64)
+
+    while True:
+        roots1, roots2 = parents[sources], parents[targets]
+        if np.array_equal(roots1, roots2):
+            break
+        np.minimum.at(parents, np.maximum(roots1, roots2), np.minimum(roots1, roots2))
+
+        grandparents = parents[parents]
+        while not np.array_equal(parents, grandparents):
+            parents = grandparents
+            grandparents = parents[parents]
+
+    # Every root is the smallest member of its component.
+    roots = np.flatnonzero(parents == np.arange(num_of_nodes))
+    return np.searchsorted(roots, parents).astype(np.int32)
+
+
+def random_matching(edges, num_of_nodes, num_of_edges, rng):
+    """
+    Select up to `num_of_edges` disjoint edges uniformly at random from an (E, 2)
+    edge array, using a numpy Generator. Scanning a shuffled edge array and keeping
+    each edge whose nodes are both unused is equivalent to repeatedly choosing an
+    edge at random and removing its nodes from the graph, without copying it.
+
+    Returns an (M, 2) array of node index pairs, where M < num_of_edges only when
+    no further disjoint edges remain.
+    """
+
+    used = bytearray(num_of_nodes)
+    pairs = list()
+    order = rng.permutation(len(edges))
+
+    # Most selections finish early, so shuffled edges are examined in blocks.
+    block = max(2 * num_of_edges, 64)
+    for start in range(0, len(order), block):
+        if len(pairs) == num_of_edges:
+            break
+        for x, y in edges[order[start:start + block]].tolist():
+            if not used[x] and not used[y]:
+                used[x] = used[y] = 1
+                pairs.append((x, y))
+                if len(pairs) == num_of_edges:
+                    break
+
+    return np.array(pairs, np.int32).reshape(-1, 2)
@@ -0,0 +1,143 @@
+# A throttled progress line for long-running experiments.
+
+import multiprocessing
+import sys
+import time
+
+class Progress:
+    """
+    Reports the current test and iteration, the iteration rate and an estimated
+    time remaining on a single terminal line, at most `rate` times per second.
+    Where tests run in worker processes, the number of completed tests is reported
+    instead, as each test completes. Nothing is reported when stdout is not a
+    terminal (e.g., batch logs) or from within a worker process.
+    """
+
+    def __init__(self, tests, iteration_limit, rate = 4.0, stream = None):
+
+        self.tests = tests
+        self.iteration_limit = iteration_limit
+        self.interval = 1.0 / rate
+        self.stream = sys.stdout if stream is None else stream
+        self.enabled = self.stream.isatty() and multiprocessing.parent_process() is None
+
+        self.start = time.monotonic()
+        self.last_report = 0.0
+        self.completed_tests = 0
+        self.completed_iterations = 0
+
+
+    def due(self, force = False):
+        """
+        The time elapsed since the start, if enough time has passed since the last
+        report to report again, or `force` is set, and None otherwise.
+        """
+
+        if not self.enabled:
+            return None
+
+        now = time.monotonic()
+        if not force and now - self.last_report < self.interval:
+            return None
+        self.last_report = now
+
+        return now - self.start
+
+
+    def update(self, test, iteration):
+        """ Note the current iteration of a test, reporting if enough time has passed. """
+
+        elapsed = self.due()
+        if elapsed is None:
+            return
+
+        iterations = self.completed_iterations + iteration
+        rate = iterations / elapsed if elapsed > 0 else 0.0
+
+        self.write("Test #{} - Iteration #{} - {:.0f} it/s - ETA {}".format(
+            test + 1, iteration, rate, self.format_time(self.remaining(iteration, rate))
+        ))
+
+
+    def update_batch(self, iteration):
+        """
+        Note the current iteration of a batch of tests that are stepped together,
+        reporting if enough time has passed. The rate is of batch iterations.
+        """
+
+        elapsed = self.due()
+        if elapsed is None:
+            return
+
+        rate = iteration / elapsed if elapsed > 0 else 0.0
+
+        self.write("Tests {}/{} complete - Iteration #{} - {:.0f} it/s".format(
+            self.completed_tests, self.tests, iteration, rate
+        ))
+
+
+    def complete(self, test, iterations):
+        """
+        Note that a test has finished after the given number of iterations,
+        reporting the number of completed tests if enough time has passed.
+        """
+
+        self.completed_tests += 1
+        self.completed_iterations += iterations
+
+        finished = self.completed_tests == self.tests
+        elapsed = self.due(force=finished)
+        if elapsed is not None:
+            rate = self.completed_iterations / elapsed if elapsed > 0 else 0.0
+            self.write("Tests {}/{} complete - {:.0f} it/s - ETA {}".format(
+                self.completed_tests, self.tests, rate,
+                self.format_time(self.remaining(0, rate))
+            ))
+
+        if finished:
+            self.close()
+
+
+    def remaining(self, iteration, rate):
+        """
+        Estimated seconds remaining: tests that have yet to finish are assumed to run
+        for as many iterations as the average completed test, or to the iteration
+        limit if no test has completed.
+        """
+
+        if rate == 0:
+            return None
+
+        if self.completed_tests > 0:
+            per_test = self.completed_iterations / self.completed_tests
+        else:
+            per_test = self.iteration_limit
+
+        remaining_tests = self.tests - self.completed_tests
+        return (remaining_tests * per_test - iteration) / rate
+
+
+    @staticmethod
+    def format_time(seconds):
+        """ Format a number of seconds as hh:mm:ss. """
+
+        if seconds is None:
+            return "--:--:--"
+
+        seconds = int(max(seconds, 0))
+        return "{:02d}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+    def write(self, line):
+        """ Overwrite the progress line. """
+
+        self.stream.write("\r" + line + "    ")
+        self.stream.flush()
+
+
+    def close(self):
+        """ End the progress line. """
+
+        if self.enabled:
+            self.stream.write("\n")
+            self.stream.flush()
@@ -73,3 +73,106 @@ def write_to_file(directory, file_name, params, data, max, array_data = False):
             if i > max:
                 break
 
+
+
+class RunningStatistics:
+    """
+    Welford accumulators of the mean, variance, minimum and maximum of a series of
+    values across tests, kept separately for each iteration (row) and statistic
+    (column) without storing the values themselves.
+    """
+
+    def __init__(self, rows, columns):
+
+        self.count = np.zeros((rows, 1))
+        self.mean = np.zeros((rows, columns))
+        self.m2 = np.zeros((rows, columns))
+        self.min = np.full((rows, columns), np.inf)
+        self.max = np.full((rows, columns), -np.inf)
+
+
+    def update(self, start, values):
+        """
+        Add a test's values to the rows from `start` onwards. A single row of values
+        is added to every remaining row, e.g., after the test has converged.
+        """
+
+        values = np.asarray(values, float)
+        stop = len(self.mean) if values.ndim == 1 else start + len(values)
+        rows = slice(start, stop)
+
+        self.count[rows] += 1
+        delta = values - self.mean[rows]
+        self.mean[rows] += delta / self.count[rows]
+        self.m2[rows] += delta * (values - self.mean[rows])
+        self.min[rows] = np.minimum(self.min[rows], values)
+        self.max[rows] = np.maximum(self.max[rows], values)
+
+
+    def variance(self):
+        """ The population variance of each row and column. """
+
+        return self.m2 / np.maximum(self.count, 1)
+
+
+class LossTrajectories:
+    """
+    A compact record of the per-iteration loss statistics of each test. Tests stop
+    changing once converged, so only the iterations up to and including the
+    converged iteration are kept, and full trajectories are rebuilt when read.
+    """
+
+    def __init__(self, tests, iteration_limit, columns = 4):
+
+        self.iteration_limit = iteration_limit
+        self.converged = np.full(tests, iteration_limit, np.int32)
+        self.trajectories = [None for x in range(tests)]
+        self.statistics = RunningStatistics(iteration_limit + 1, columns)
+
+
+    def record(self, test, trajectory):
+        """
+        Record a test's trajectory, which ends at the iteration at which the test
+        converged, or at the iteration limit.
+        """
+
+        self.converged[test] = len(trajectory) - 1
+        self.trajectories[test] = np.array(trajectory)
+
+        self.statistics.update(0, trajectory)
+        if len(trajectory) <= self.iteration_limit:
+            self.statistics.update(len(trajectory), trajectory[-1])
+
+
+    def data(self):
+        """ The record as a dictionary of arrays, for writing to a file. """
+
+        return {
+            "iteration_limit": self.iteration_limit,
+            "converged": self.converged,
+            "trajectories": self.trajectories,
+            "mean": self.statistics.mean,
+            "variance": self.statistics.variance(),
+            "min": self.statistics.min,
+            "max": self.statistics.max
+        }
+
+
+def dense_loss(data):
+    """
+    Rebuild the dense (iterations x tests x statistics) loss array from a streamed
+    record, as written by LossTrajectories. Dense loss arrays are returned as given.
+    """
+
+    if not isinstance(data, dict):
+        return data
+
+    trajectories = data["trajectories"]
+    loss_results = np.zeros(
+        (data["iteration_limit"] + 1, len(trajectories), trajectories[0].shape[1])
+    )
+    for test, trajectory in enumerate(trajectories):
+        loss_results[:len(trajectory), test] = trajectory
+        loss_results[len(trajectory):, test] = trajectory[-1]
+
+    return loss_results
@@ -0,0 +1,136 @@
+# Random number generation for simulations, based on numpy's PCG64 generator. Each
+# test has independent streams derived from a master seed via SeedSequence.spawn,
+# so that tests are reproducible regardless of the order in which they are run.
+
+import random
+
+import numpy as np
+
+class Random(random.Random):
+    """
+    A random.Random whose bits are drawn from a numpy Generator, so that it can be
+    passed to code expecting random.Random (agents, topologies, networkx) while its
+    `generator` is used directly for batched draws.
+
+    Scalar floats and words of bits are drawn from the generator in blocks, as a
+    single draw from a numpy Generator costs far more than one from random.Random.
+    """
+
+    block_size = 1024
+
+    def __init__(self, seed = None):
+
+        self.generator = None
+        super().__init__(seed)
+
+
+    def seed(self, a = None, version = 2):
+        """ Seed from an integer, a numpy SeedSequence or, if None, fresh entropy. """
+
+        if not isinstance(a, np.random.SeedSequence):
+            a = np.random.SeedSequence(a)
+
+        self.generator = np.random.Generator(np.random.PCG64(a))
+        self.floats, self.float_position = [], 0
+        self.words, self.word_position = [], 0
+
+
+    def random(self):
+
+        if self.float_position == len(self.floats):
+            self.floats = self.generator.random(self.block_size).tolist()
+            self.float_position = 0
+
+        self.float_position += 1
+        return self.floats[self.float_position - 1]
+
+
+    def getrandbits(self, k):
+
+        if k == 0:
+            return 0
+
+        # Up to 32 bits are taken from the top of a single 32-bit word.
+        if k <= 32:
+            if self.word_position == len(self.words):
+                self.words = self.generator.integers(
+                    0, 1 << 32, self.block_size, np.uint32
+                ).tolist()
+                self.word_position = 0
+
+            self.word_position += 1
+            return self.words[self.word_position - 1] >> (32 - k)
+
+        num_of_bytes = (k + 7) // 8
+        bits = int.from_bytes(self.generator.bytes(num_of_bytes), "little")
+
+        return bits >> (num_of_bytes * 8 - k)
+
+
+    def getstate(self):
+        return (
+            self.generator.bit_generator.state,
+            self.floats[self.float_position:],
+            self.words[self.word_position:]
+        )
+
+
+    def setstate(self, state):
+
+        self.generator.bit_generator.state = state[0]
+        self.floats, self.float_position = list(state[1]), 0
+        self.words, self.word_position = list(state[2]), 0
+
+
+class Streams:
+    """
+    The independent random streams of a single test: one for generating the
+    network topology, one for the agents and the world (true state, initial beliefs
+    and evidence), and one for belief fusion. Nothing but the network is drawn from
+    the topology stream, so that a test's network is the same whatever the engine
+    or agent type.
+    """
+
+    def __init__(self, topology, agents, fusion, seed_sequence = None):
+
+        self.topology = topology
+        self.agents = agents
+        self.fusion = fusion
+        # The SeedSequence from which the streams were derived, if any.
+        self.seed_sequence = seed_sequence
+
+
+    @classmethod
+    def spawn(cls, seed_sequence):
+        """ Derive the streams of a test from the test's SeedSequence. """
+
+        return cls(*[Random(child) for child in seed_sequence.spawn(3)], seed_sequence)
+
+
+    @classmethod
+    def shared(cls, random_instance):
+        """ Streams that all draw from a single random.Random, as in earlier versions. """
+
+        return cls(random_instance, random_instance, random_instance)
+
+
+    def generators(self):
+        """
+        The numpy Generators for evidence and for fusion in the population engines.
+        Shared streams have a single Generator, seeded from the shared random.Random.
+        """
+
+        if isinstance(self.agents, Random):
+            return self.agents.generator, self.fusion.generator
+
+        generator = np.random.default_rng(self.agents.getrandbits(64))
+        return generator, generator
+
+
+def test_seeds(seed, tests):
+    """
+    One SeedSequence per test, spawned from a master seed, or from fresh entropy
+    if the seed is None.
+    """
+
+    return np.random.SeedSequence(seed).spawn(tests)
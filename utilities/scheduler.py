@@ -0,0 +1,77 @@
+# Event-driven scheduling of agent actions that each occur independently with some
+# small probability per iteration, so that only the agents due to act are touched.
+
+import heapq
+
+import numpy as np
+
+class EventScheduler:
+    """
+    Schedules, for each agent, the next iteration at which it acts, where it acts
+    in each iteration independently with the given probability. The gaps between
+    such iterations are geometrically distributed, so they are sampled directly
+    and kept in a priority queue, rather than drawing for every agent in every
+    iteration.
+    """
+
+    def __init__(self, num_of_agents, probability, rng, start = 0):
+
+        self.probability = probability
+        self.rng = rng
+        self.queue = list()
+
+        if probability > 0:
+            times = start + rng.geometric(min(probability, 1.0), num_of_agents)
+            self.queue = list(zip(times.tolist(), range(num_of_agents)))
+            heapq.heapify(self.queue)
+
+
+    def next_iteration(self):
+        """ The next iteration at which any agent acts, or None if none ever will. """
+
+        return self.queue[0][0] if len(self.queue) > 0 else None
+
+
+    def due(self, iteration):
+        """
+        The indices of the agents that act at the given iteration, which are then
+        rescheduled. Iterations must be visited in increasing order.
+        """
+
+        agents = list()
+        while len(self.queue) > 0 and self.queue[0][0] <= iteration:
+            agents.append(heapq.heappop(self.queue)[1])
+
+        if len(agents) > 0:
+            times = iteration + self.rng.geometric(min(self.probability, 1.0), len(agents))
+            for time, agent in zip(times.tolist(), agents):
+                heapq.heappush(self.queue, (time, agent))
+
+        return np.array(agents, np.int64)
+
+
+class Schedule:
+    """
+    The evidence and fusion schedules of a population. Fusion is only scheduled
+    if `fusion_prob` is given, i.e., when each agent listens independently.
+    """
+
+    def __init__(self, num_of_agents, evidence_rate, rng, fusion_prob = None, fusion_rng = None):
+
+        self.evidence = EventScheduler(num_of_agents, evidence_rate, rng)
+        self.fusion = None
+        if fusion_prob is not None:
+            self.fusion = EventScheduler(num_of_agents, fusion_prob, fusion_rng)
+
+
+    def idle(self, iteration):
+        """ Check whether no scheduled agent acts at the given iteration. """
+
+        for scheduler in [self.evidence, self.fusion]:
+            if scheduler is None:
+                continue
+            next_iteration = scheduler.next_iteration()
+            if next_iteration is not None and next_iteration <= iteration:
+                return False
+
+        return True
@@ -1,50 +1,125 @@
 import random
 
+import numpy as np
+
+class Canonical:
+    """
+    A stand-in for a random.Random that leaves every ordering as it is, so that
+    the generators below give a fixed, canonical labelling of their topology.
+    Shuffling the node labels of the canonical topology then gives the same
+    graphs as the generators themselves.
+    """
+
+    def shuffle(self, x):
+        return
+
+
+    def choice(self, seq):
+        return seq[0]
+
+
+def shuffled(agents: int, random_instance):
+    """ The agent indices in the order given by shuffling them with random_instance. """
+
+    agent_indices = [x for x in range(agents)]
+    random_instance.shuffle(agent_indices)
+
+    return np.array(agent_indices, np.int32)
+
+
+def check_divisible(agents: int, clique_size: int, name: str):
+
+    if agents % clique_size != 0:
+        raise ValueError(
+            "Number of agents is not divisible by {}: required for {} network.".format(clique_size, name)
+        )
+
+
+def hubs_and_spokes(agents: int, clique_size: int, random_instance):
+    """
+    Shuffle the agents, then take one hub per clique from the end of the order,
+    followed by the members attached to each hub in turn, as a (hubs x members)
+    array.
+    """
+
+    agent_indices = shuffled(agents, random_instance)[::-1]
+    num_of_hubs = int(agents / clique_size)
+
+    hubs = agent_indices[:num_of_hubs]
+    pick = int((agents - num_of_hubs) / num_of_hubs)
+    spokes = agent_indices[num_of_hubs:num_of_hubs + num_of_hubs * pick].reshape(num_of_hubs, pick)
+
+    return hubs, spokes
+
+
+def ring_of(nodes):
+    """
+    Edges joining each node to the next, and the last node to the first. With
+    fewer than three nodes, closing the ring would repeat an edge or join a node
+    to itself, so the nodes are joined in a line.
+    """
+
+    if len(nodes) < 3:
+        return np.stack((nodes[:-1], nodes[1:]), axis=1)
+
+    return np.stack((nodes, np.roll(nodes, -1)), axis=1)
+
+
+def complete_of(nodes):
+    """
+    Edges joining every pair of nodes, for each row of a (groups x nodes) array,
+    in row order and then in the order of the nodes within the row.
+    """
+
+    rows, columns = np.triu_indices(nodes.shape[-1], 1)
+
+    return np.stack((nodes[..., rows], nodes[..., columns]), axis=-1).reshape(-1, 2)
+
+
 class Topologies:
-    """ A collection of functions to generate specific network topologies. """
+    """
+    A collection of functions to generate specific network topologies. Each
+    topology has a method returning an (E, 2) int32 array of edges, e.g.,
+    caveman_edges(), and a method returning the same edges as a list of tuples,
+    e.g., caveman().
+    """
 
-    def line(self, agents: int, clique_size: int, random_instance):
-        return [(x, x + 1) for x in range(agents - 1)]
+    def line_edges(self, agents: int, clique_size: int, random_instance):
 
+        nodes = np.arange(agents - 1, dtype=np.int32)
+        return np.stack((nodes, nodes + 1), axis=1)
 
-    def ring(self, agents: int, clique_size: int, random_instance):
-        return [(x, x + 1) for x in range(agents - 1)] + [(agents - 1, 0)]
 
+    def ring_edges(self, agents: int, clique_size: int, random_instance):
+        return ring_of(np.arange(agents, dtype=np.int32))
+
+
+    def star_edges(self, agents: int, clique_size: int, random_instance):
 
-    def star(self, agents: int, clique_size: int, random_instance):
         hub = random_instance.choice(range(agents))
-        return [(hub, x) for x in range(agents) if x != hub]
+        spokes = np.delete(np.arange(agents, dtype=np.int32), hub)
 
+        return np.stack((np.full_like(spokes, hub), spokes), axis=1)
 
-    def connected_star(self, agents: int, clique_size: int, random_instance):
+
+    def connected_star_edges(self, agents: int, clique_size: int, random_instance):
         """
         We place star networks around a ring where each star is
         connected to the ring via the central hub.
         """
 
-        if agents % clique_size != 0:
-            sys.exit("Number of agents is not divisible by {}: required for Connected Star network.".format(clique_size))
-
-        edges = []
-        agent_indices = [x for x in range(agents)]
-        random_instance.shuffle(agent_indices)
-
-        hubs = [agent_indices.pop() for x in range(int(agents / clique_size))]
-
-        # First, connect the hubs together in a ring.
-        edges += [(hubs[x], hubs[x + 1]) for x in range(len(hubs) - 1)]
-        edges += [(hubs[-1], hubs[0])]
+        check_divisible(agents, clique_size, "Connected Star")
+        hubs, spokes = hubs_and_spokes(agents, clique_size, random_instance)
 
-        # Then, create the star graphs attached to each hub node.
-        pick = int(len(agent_indices) / len(hubs))
-        for hub in hubs:
-            chosen_nodes = [agent_indices.pop() for x in range(pick)]
-            edges += [(hub, x) for x in chosen_nodes if x != hub]
+        # First, connect the hubs together in a ring, then create the star graphs
+        # attached to each hub node.
+        return np.concatenate((
+            ring_of(hubs),
+            np.stack((np.repeat(hubs, spokes.shape[1]), spokes.ravel()), axis=1)
+        ))
 
-        return edges
 
-
-    def complete_star(self, agents: int, clique_size: int, random_instance):
+    def complete_star_edges(self, agents: int, clique_size: int, random_instance):
         """
         We place star networks around a ring where each hub is a node on the ring.
         We then connect each hub in the ring to every other hub, forming a complete
@@ -52,81 +127,208 @@ class Topologies:
         star network.
         """
 
-        if agents % clique_size != 0:
-            sys.exit("Number of agents is not divisible by {}: required for Connected Star network.".format(clique_size))
+        check_divisible(agents, clique_size, "Connected Star")
+        hubs, spokes = hubs_and_spokes(agents, clique_size, random_instance)
 
-        edges = []
-        agent_indices = [x for x in range(agents)]
-        random_instance.shuffle(agent_indices)
+        # First, connect the hubs together in a totally connected network, then
+        # create the star graphs attached to each hub node.
+        return np.concatenate((
+            complete_of(hubs),
+            np.stack((np.repeat(hubs, spokes.shape[1]), spokes.ravel()), axis=1)
+        ))
 
-        hubs = [agent_indices.pop() for x in range(int(agents / clique_size))]
 
-        # First, connect the hubs together in a totally connected network.
-        edges += [(x, y) for i, x in enumerate(hubs[:-1]) for y in hubs[i+1:]]
+    def caveman_edges(self, agents: int, clique_size: int, random_instance):
+        """
+        We place small complete graphs around a ring where each complete graph is
+        connected to the ring via a single node.
+        """
 
-        # Then, create the star graphs attached to each hub node.
-        pick = int(len(agent_indices) / len(hubs))
-        for hub in hubs:
-            chosen_nodes = [agent_indices.pop() for x in range(pick)]
-            edges += [(hub, x) for x in chosen_nodes if x != hub]
+        check_divisible(agents, clique_size, "Caveman")
+        hubs, spokes = hubs_and_spokes(agents, clique_size, random_instance)
 
-        return edges
+        # First, connect the hubs together in a ring, then create the complete
+        # graphs attached to each hub node.
+        return np.concatenate((
+            ring_of(hubs),
+            complete_of(np.concatenate((hubs[:, None], spokes), axis=1))
+        ))
 
 
-    def caveman(self, agents: int, clique_size: int, random_instance):
+    def complete_caveman_edges(self, agents: int, clique_size: int, random_instance):
         """
         We place small complete graphs around a ring where each complete graph is
-        connected to the ring via a single node.
+        connected to the ring via a single node. Each node on the main ring is then
+        connected to every other node on the ring, forming a complete graph at the
+        core of the network.
         """
 
-        if agents % clique_size != 0:
-            sys.exit("Number of agents is not divisible by {}: required for Caveman network.".format(clique_size))
+        check_divisible(agents, clique_size, "Caveman")
+        hubs, spokes = hubs_and_spokes(agents, clique_size, random_instance)
 
-        edges = []
-        agent_indices = [x for x in range(agents)]
-        random_instance.shuffle(agent_indices)
+        # First, connect the hubs together in a totally connected network, then
+        # create the complete graphs attached to each hub node.
+        return np.concatenate((
+            complete_of(hubs),
+            complete_of(np.concatenate((hubs[:, None], spokes), axis=1))
+        ))
 
-        hubs = [agent_indices.pop() for x in range(int(agents / clique_size))]
 
-        # First, connect the hubs together in a ring.
-        edges += [(hubs[x], hubs[x + 1]) for x in range(len(hubs) - 1)]
-        edges += [(hubs[-1], hubs[0])]
+    def line(self, agents: int, clique_size: int, random_instance):
+        return edge_list(self.line_edges(agents, clique_size, random_instance))
 
-        # Then, create the complete graphs attached to each hub node.
-        pick = int(len(agent_indices) / len(hubs))
-        for hub in hubs:
-            chosen_nodes = [hub]
-            chosen_nodes += [agent_indices.pop() for x in range(pick)]
-            edges += [(x, y) for i, x in enumerate(chosen_nodes[:-1]) for y in chosen_nodes[i+1:]]
 
-        return edges
+    def ring(self, agents: int, clique_size: int, random_instance):
+        return edge_list(self.ring_edges(agents, clique_size, random_instance))
 
 
-    def complete_caveman(self, agents: int, clique_size: int, random_instance):
-        """
-        We place small complete graphs around a ring where each complete graph is
-        connected to the ring via a single node. Each node on the main ring is then
-        connected to every other node on the ring, forming a complete graph at the
-        core of the network.
-        """
+    def star(self, agents: int, clique_size: int, random_instance):
+        return edge_list(self.star_edges(agents, clique_size, random_instance))
 
-        if agents % clique_size != 0:
-            sys.exit("Number of agents is not divisible by {}: required for Caveman network.".format(clique_size))
 
-        edges = []
-        agent_indices = [x for x in range(agents)]
-        random_instance.shuffle(agent_indices)
+    def connected_star(self, agents: int, clique_size: int, random_instance):
+        return edge_list(self.connected_star_edges(agents, clique_size, random_instance))
 
-        hubs = [agent_indices.pop() for x in range(int(agents / clique_size))]
 
-        # First, connect the hubs together in a totally connected network.
-        edges += [(x, y) for i, x in enumerate(hubs[:-1]) for y in hubs[i+1:]]
+    def complete_star(self, agents: int, clique_size: int, random_instance):
+        return edge_list(self.complete_star_edges(agents, clique_size, random_instance))
 
-        # Then, create the complete graphs attached to each hub node.
-        pick = int(len(agent_indices) / len(hubs))
-        for hub in hubs:
-            chosen_nodes = [hub]
-            chosen_nodes += [agent_indices.pop() for x in range(pick)]
-            edges += [(x, y) for i, x in enumerate(chosen_nodes[:-1]) for y in chosen_nodes[i+1:]]
 
-        return edges
\ No newline at end of file
+    def caveman(self, agents: int, clique_size: int, random_instance):
+        return edge_list(self.caveman_edges(agents, clique_size, random_instance))
+
+
+    def complete_caveman(self, agents: int, clique_size: int, random_instance):
+        return edge_list(self.complete_caveman_edges(agents, clique_size, random_instance))
+
+
+def gnp_edges(agents: int, p: float, rng):
+    """
+    An Erdos-Renyi G(n, p) random graph as an (E, 2) int32 array, using a numpy
+    Generator. Rather than drawing for each of the n(n - 1)/2 possible edges, the
+    gaps between consecutive edges in a fixed ordering of the possible edges are
+    geometrically distributed, so only O(n + E) numbers are drawn.
+    """
+
+    pairs = agents * (agents - 1) // 2
+    if p <= 0 or pairs == 0:
+        return np.zeros((0, 2), np.int32)
+    if p >= 1:
+        return np.stack(np.triu_indices(agents, 1), axis=1).astype(np.int32)
+
+    # Draw the gaps in blocks a little larger than the expected number of edges.
+    positions = list()
+    position = -1
+    block = int(pairs * p + 4 * np.sqrt(pairs * p) + 16)
+    while position < pairs:
+        block_positions = position + np.cumsum(rng.geometric(p, block))
+        positions.append(block_positions)
+        position = block_positions[-1]
+    positions = np.concatenate(positions)
+    positions = positions[positions < pairs]
+
+    # Possible edges (u, v) with u < v are ordered by v and then by u, so that the
+    # edge at position k has v(v - 1)/2 <= k < v(v + 1)/2.
+    v = ((1 + np.sqrt(1 + 8 * positions.astype(np.float64))) // 2).astype(np.int64)
+    v -= v * (v - 1) // 2 > positions
+    v += (v + 1) * v // 2 <= positions
+    u = positions - v * (v - 1) // 2
+
+    return np.stack((u, v), axis=1).astype(np.int32)
+
+
+def watts_strogatz_edges(agents: int, k: int, p: float, rng):
+    """
+    A Watts-Strogatz small-world graph as an (E, 2) int32 array, using a numpy
+    Generator: a ring lattice joining each node to its k // 2 nearest neighbours on
+    either side, in which the far end of each edge is rewired with probability p
+    to a uniformly random node, avoiding self-loops and duplicate edges. As in
+    networkx, a node already joined to every other node is not rewired, and an
+    edge that cannot be rewired keeps its original end.
+    """
+
+    if k >= agents:
+        return np.stack(np.triu_indices(agents, 1), axis=1).astype(np.int32)
+
+    sources = np.repeat(np.arange(agents, dtype=np.int64), k // 2)
+    targets = (sources + np.tile(np.arange(1, k // 2 + 1), agents)) % agents
+
+    def keys(x, y):
+        return np.minimum(x, y) * agents + np.maximum(x, y)
+
+    original_keys = keys(sources, targets)
+    rewired = np.flatnonzero(rng.random(len(sources)) < p)
+
+    # The keys of every current edge. An edge keeps its original end until it is
+    # rewired, so that keeping the original end never duplicates another edge.
+    existing = original_keys
+
+    # Rejected choices are drawn again, for a bounded number of rounds, after
+    # which an edge that still cannot be rewired keeps its original end.
+    pending = rewired
+    for attempt in range(100):
+        degrees = np.bincount(
+            np.concatenate((existing // agents, existing % agents)), minlength=agents
+        )
+        pending = pending[degrees[sources[pending]] < agents - 1]
+        if len(pending) == 0:
+            break
+
+        choices = rng.integers(0, agents, len(pending))
+        candidates = keys(sources[pending], choices)
+        _, first = np.unique(candidates, return_index=True)
+        accepted = np.zeros(len(pending), dtype=bool)
+        accepted[first] = True
+        accepted &= (choices != sources[pending]) & ~np.isin(candidates, existing)
+
+        targets[pending[accepted]] = choices[accepted]
+        existing = np.concatenate((
+            existing[~np.isin(existing, original_keys[pending[accepted]])],
+            candidates[accepted]
+        ))
+        pending = pending[~accepted]
+
+    return np.stack((sources, targets), axis=1).astype(np.int32)
+
+
+def barabasi_albert_edges(agents: int, m: int, rng):
+    """
+    A Barabasi-Albert preferential attachment graph as an (E, 2) int32 array, using
+    a numpy Generator. Starting from a star of m + 1 nodes, each new node attaches
+    to m distinct existing nodes, chosen from an array in which every node appears
+    once for each of its edges, so that nodes are chosen in proportion to degree.
+    """
+
+    if m < 1 or m >= agents:
+        raise ValueError("Barabasi-Albert graphs require 1 <= m < agents, got m = {}.".format(m))
+
+    # Random numbers are drawn in blocks, as the nodes must be added in turn.
+    uniforms = rng.random(agents * m * 2).tolist()
+    position = 0
+
+    sources = [0] * m
+    targets = list(range(1, m + 1))
+    repeated_nodes = sources + targets
+
+    for source in range(m + 1, agents):
+        chosen = set()
+        while len(chosen) < m:
+            if position == len(uniforms):
+                uniforms = rng.random(agents * m).tolist()
+                position = 0
+            chosen.add(repeated_nodes[int(uniforms[position] * len(repeated_nodes))])
+            position += 1
+        chosen = list(chosen)
+
+        sources += [source] * m
+        targets += chosen
+        repeated_nodes += chosen
+        repeated_nodes += [source] * m
+
+    return np.array([sources, targets], np.int32).T.copy()
+
+
+def edge_list(edges):
+    """ An (E, 2) edge array as a list of tuples. """
+
+    return [(x, y) for x, y in edges.tolist()]
@@ -1,22 +1,40 @@
 import argparse
-import lzma
+import itertools
 import networkx as nx
-import pickle
 import random
 import sys
 
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 from numpy.lib.function_base import _update_dim_sizes
 from numpy.lib.stride_tricks import broadcast_arrays
 
 # from agents.agent import Agent
 from agents.agent import *
+from agents import jit
+from agents.packed import PackedPopulation
+from agents.population import (
+    BatchPopulation, Population, evidence_only_losses, population_types
+)
+from utilities import cache
 from utilities import results
 from utilities import topologies
+from utilities.progress import Progress
+from utilities.scheduler import Schedule
+from utilities.rng import Random, Streams, test_seeds
+from utilities.network import (
+    Adjacency, ComponentIndex, Topology, TopologyCache, TopologyStore, random_matching
+)
 
 tests = 100
 iteration_limit = 10_000
 steady_state_threshold = 100
+# Optionally end a test early: once no agent's belief has changed for this many
+# consecutive iterations, and/or once the average loss has changed by no more than
+# a tolerance over a number of iterations, given as (iterations, tolerance).
+early_exit_unchanged = None
+early_exit_plateau = None
 trajectory_populations = [10, 50, 100]
 
 # Set the graph type
@@ -31,6 +49,11 @@ clique_graphs = [
 graph_type = "ER"
 
 evidence_only = False
+# Simulate evidence-only runs of three-valued agents directly from the times at which
+# each agent receives evidence, rather than iteration by iteration.
+fast_forward = True
+# Symmetric: pairs of neighbours adopt a shared belief | Asymmetric: each agent
+# hears any agent in its connected component | Local: each agent hears a neighbour.
 update_type = "Asymmetric"    # Asymmetric
 
 fusion_rates = [1, 5, 10, 20, 30, 40, 50]   # Number of pairs of agents to be selected for belief fusion
@@ -49,6 +72,56 @@ m_values = [1, 2, 3, 4, 5, 10, 30, 50]
 m_value = 1
 clique_size = 10
 
+# Generate deterministic topologies (line, ring) once, and the star and clique
+# topologies once in a canonical labelling that is shuffled for each test.
+cache_topologies = True
+# Also generate each random graph (ER, WS, BA) once per configuration and seed,
+# relabelling its agents at random for each test, rather than sampling a new graph
+# for every test. Only suitable where the experiment does not need independent graphs.
+reuse_random_topologies = False
+topology_cache = TopologyCache()
+# Generate random graphs (ER, WS, BA) directly as edge arrays from a numpy Generator
+# rather than with networkx, which is far faster for large or dense graphs but
+# draws different graphs for the same seed.
+native_random_graphs = False
+# Keep each test's random graph in this directory, as memory-mapped .npy files that
+# are shared by later runs and by worker processes, e.g., "../results/topologies/".
+topology_directory = None
+
+# Set how loss trajectories are stored: "dense" writes an (iterations x tests x 4)
+# array, whereas "streaming" writes each test's trajectory only up to convergence,
+# alongside running statistics across tests. See results.dense_loss().
+loss_storage = "dense"
+
+# Draw every test from a single shared random.Random, as in earlier versions, rather
+# than from independent numpy Generator streams for each test.
+legacy_random = False
+
+# Skip configurations whose results have already been written by an identical run.
+use_cache = True
+
+# Set the simulation engine: "object" steps each Agent object in turn, whereas
+# "population" steps the whole population as a single belief matrix, and "packed"
+# does the same with beliefs stored as bit-planes for very large numbers of states.
+# "batch" steps the populations of all tests at once, as a single belief matrix of
+# (tests x agents) rows, which suits small populations.
+engine = "object"
+# In the population engines, sample the next iteration at which each agent receives
+# evidence (and, for Asymmetric or Local fusion, listens) rather than drawing for
+# every agent in every iteration, and skip iterations in which no agent acts. This
+# pays off for low evidence rates and fusion probabilities.
+event_driven = False
+# In the object engine, step agents of the types that have a population engine as
+# AgentViews over the arrays of a Population, rather than as separate Agent objects,
+# which takes far less memory per agent, though each step is slower. Views do not
+# share belief arrays, so Symmetric VoterAgent partners no longer alias one another.
+agent_views = False
+# In the population engine, run each iteration as a single loop compiled with Numba,
+# if it is installed, rather than as a sequence of NumPy operations. This suits
+# small populations, particularly of VoterAgent, StochasticAgent and
+# CautiousAdventurousAgent, whose operators draw per pair or per proposition.
+numba_backend = False
+
 # Set the type of agent: three-valued, voter or probabilistic
 # (Three-valued) Agent | VoterAgent | StochasticAgent
 # ProbabilisticAgent | DampenedAgent | AverageAgent
@@ -58,61 +131,163 @@ agent_type = Agent
 # initialisation functions later.
 init_beliefs = agent_type.ignorant_belief
 
-# TODO:
-# 1. Remove separate agents(nodes) and edges lists, using only networkx instead.
-
 def initialisation(
-    num_of_agents, states, network, connectivity, knn, m, random_instance
+    num_of_agents, states, connectivity, knn, m, random_instance, objects=True, seed=None,
+    test_seed=None, true_state=None, agent_random=None
 ):
     """
-    This initialisation function
-    print(steady_state_results)runs before any other part of the code. Starting with
-    the creation of agents and the initialisation of relevant variables.
+    This initialisation function runs before any other part of the code. Starting
+    with the creation of agents and the initialisation of relevant variables.
+    The network is drawn from `random_instance`, and any random initial beliefs
+    from `agent_random` (by default, also `random_instance`).
+
+    Returns the list of agents, or None if `objects` is False (the population
+    engines hold their own beliefs), and the network.Topology of the agents, whose
+    nodes are indices into the list. With agent_views set, the agents are
+    AgentViews over a Population of the given true state.
+    """
+
+    if agent_random is None:
+        agent_random = random_instance
+
+    agents = None
+    if objects and agent_type.__name__ == "VoterAgent":
+        beliefs = [init_beliefs(states, agent_random) for x in range(num_of_agents)]
+    # if agent_type.__name__ == "Agent" or agent_type.__name__ == "ProbabilisticAgent":
+    elif objects:
+        beliefs = [init_beliefs(states) for x in range(num_of_agents)]
+
+    if objects and agent_views and agent_type.__name__ in population_types:
+        agents = Population(
+            agent_type, num_of_agents, states, true_state, steady_state_threshold, beliefs
+        ).agents()
+    elif objects:
+        # Number the agents of each test from 0.
+        Agent.identity = 0
+        agents = [agent_type(belief) for belief in beliefs]
+
+    topology = network_topology(
+        num_of_agents, connectivity, knn, m, random_instance, seed, test_seed
+    )
+
+    return agents, topology
+
+
+def generate_edges(num_of_agents, connectivity, knn, m, random_instance):
+    """
+    Generate a network of the current graph_type as an (E, 2) int32 array of
+    agent indices.
     """
 
     topology = topologies.Topologies()
 
-    identity = 0
-    agents = list()
-    edges = list()
+    if native_random_graphs and graph_type in random_graphs:
+        if isinstance(random_instance, Random):
+            rng = random_instance.generator
+        else:
+            rng = np.random.default_rng(random_instance.getrandbits(64))
 
-    if agent_type.__name__ == "VoterAgent":
-        agents += [agent_type(init_beliefs(states, random_instance)) for x in range(num_of_agents)]
-    # if agent_type.__name__ == "Agent" or agent_type.__name__ == "ProbabilisticAgent":
-    else:
-        agents += [agent_type(init_beliefs(states)) for x in range(num_of_agents)]
+        if graph_type == "ER":
+            return topologies.gnp_edges(num_of_agents, connectivity, rng)
+        elif graph_type == "WS":
+            return topologies.watts_strogatz_edges(num_of_agents, knn, connectivity, rng)
+        return topologies.barabasi_albert_edges(num_of_agents, m, rng)
 
     # Produce a random graph (Erdos-Renyi) with a connectivity parameter p
     if graph_type == "ER":
-        edges += nx.gnp_random_graph(len(agents), connectivity, random_instance).edges
+        edges = nx.gnp_random_graph(num_of_agents, connectivity, random_instance).edges
     # Produce a random small-world graph (Watts-Strogatz) with k nearest neighbours
     # and a connectivity parameter p
     elif graph_type == "WS":
-        edges += nx.watts_strogatz_graph(len(agents), knn, connectivity, random_instance).edges
+        edges = nx.watts_strogatz_graph(num_of_agents, knn, connectivity, random_instance).edges
     elif graph_type == "BA":
-        edges += nx.barabasi_albert_graph(len(agents), m, random_instance).edges
+        edges = nx.barabasi_albert_graph(num_of_agents, m, random_instance).edges
     else:
         try:
-            edges += getattr(topology, graph_type)(len(agents), clique_size, random_instance)
+            generator = getattr(topology, graph_type + "_edges")
         except AttributeError:
             sys.exit("Topology does not match a corresponding topology generator function.")
+        return generator(num_of_agents, clique_size, random_instance)
 
-    # For Python 3.6+, dictionaries maintain a consistent order, so node/agent order
-    # should be maintained.
-    edges = map(lambda x: (agents[x[0]], agents[x[1]]), edges)
-    network.update(edges, agents)
+    return np.array(list(edges), np.int32).reshape(-1, 2)
+
+
+def network_topology(
+    num_of_agents, connectivity, knn, m, random_instance, seed=None, test_seed=None
+):
+    """
+    The network.Topology of a test. Unless cache_topologies is False, topologies
+    that do not depend on the random instance, or only through the labelling of
+    their nodes, are generated once and kept in the topology_cache, together with
+    their connected components. Random graphs are shared in the same way only if
+    reuse_random_topologies is set and the master seed is fixed. Otherwise, random
+    graphs are kept in the topology_directory, if set, keyed on the SeedSequence of
+    the test, as they are drawn from the test's topology stream, from which nothing
+    else is drawn.
+    """
+
+    def build(random_instance):
+        return Topology(
+            generate_edges(num_of_agents, connectivity, knn, m, random_instance), num_of_agents
+        ).build_indices()
+
+    def relabelled(topology):
+        # Local fusion needs the Adjacency, which is computed once for the shared
+        # topology and then relabelled for each test, rather than rebuilt.
+        topology.build_indices(adjacency=update_type == "Local")
+        labels = list(range(num_of_agents))
+        random_instance.shuffle(labels)
+        return topology.relabel(labels)
+
+    key = (graph_type, num_of_agents, clique_size, connectivity, knn, m)
+
+    if cache_topologies and graph_type in ["line", "ring"]:
+        return topology_cache.get(key, lambda: build(None))
+    elif cache_topologies and graph_type in ["star"] + clique_graphs:
+        # The generators draw only a shuffle of the agents (or the hub of a star),
+        # so a shuffle of the canonical topology's labels gives the same graphs.
+        canonical = topology_cache.get(key, lambda: build(topologies.Canonical()))
+        return relabelled(canonical)
+    elif cache_topologies and reuse_random_topologies and seed is not None:
+        # A single graph is drawn from a stream of its own, distinct from every
+        # test's, and each test sees it under a random relabelling of its agents.
+        shared = topology_cache.get(
+            key + (seed,), lambda: build(Random(np.random.SeedSequence((seed, 1))))
+        )
+        return relabelled(shared)
+
+    if topology_directory is not None and test_seed is not None:
+        store_key = cache.configuration_key({
+            "graph_type": graph_type, "agents": num_of_agents, "clique_size": clique_size,
+            "connectivity": connectivity, "knn": knn, "m": m,
+            "native_random_graphs": native_random_graphs,
+            "entropy": test_seed.entropy, "spawn_key": test_seed.spawn_key,
+            "code_version": cache.code_version()
+        })
+        return TopologyStore(topology_directory).get(store_key, lambda: build(random_instance))
+
+    return Topology(
+        generate_edges(num_of_agents, connectivity, knn, m, random_instance), num_of_agents
+    )
 
-    return
 
 def main_loop(
-    states: int, network, true_state: list(), random_instance,
-    entropy_data, error_data
+    states: int, agents, edges, true_state: list(), random_instance,
+    entropy_data, error_data, components=None, adjacency=None, rng=None,
+    fusion_random=None
 ):
     """
     The main loop performs various actions in sequence until certain conditions are
-    met, or the maximum number of iterations is reached.
+    met, or the maximum number of iterations is reached. The network is an (E, 2)
+    array of indices into `agents`, and does not change during a test, so its
+    ComponentIndex and Adjacency can be passed in rather than rebuilt. Fusion draws
+    from `fusion_random` if given, and Symmetric pairs are drawn using the numpy
+    Generator `rng`.
     """
 
+    if fusion_random is None:
+        fusion_random = random_instance
+
     # Format: before, after evidence, after consensus.
     entropy_distributions = [0 for x in range(states)]
     entropy_diffs = [0 for x in range(states)]
@@ -120,7 +295,7 @@ def main_loop(
     # For each agent, provided that the agent is to receive evidence this iteration
     # according to the current evidence rate, have the agent perform evidential updating.
     reached_convergence = True
-    for agent in network.nodes:
+    for agent in agents:
         # Generate prior distribution
         for s, state in enumerate(agent.belief):
             entropy_distributions[s] += state
@@ -145,22 +320,34 @@ def main_loop(
 
     if update_type == "Symmetric":
 
-        network_copy = network.copy()
+        if rng is None:
+            rng = np.random.default_rng(fusion_random.getrandbits(64))
 
         if fusion_rate is not None:
-            num_of_edges = int(network.number_of_nodes() * (fusion_rate/100))
+            num_of_edges = int(len(agents) * (fusion_rate/100))
         else:
             num_of_edges = 1
 
-        for i in range(num_of_edges):
-            try:
-                agent1, agent2 = random_instance.choice(list(network_copy.edges))
-            except IndexError:
-                return True
+        pairs = random_matching(edges, len(agents), num_of_edges, rng)
+
+        if issubclass(agent_type, ProbabilisticAgent):
+            # The pairs are disjoint, and probabilistic consensus draws nothing, so
+            # every pair is fused at once.
+            new_beliefs = agent_type.fuse(
+                [agents[x].belief for x in pairs[:, 0]], [agents[y].belief for y in pairs[:, 1]]
+            )
+            for (x, y), new_belief in zip(pairs.tolist(), new_beliefs):
+                # Symmetric, so both agents adopt the combination belief.
+                agents[x].update_belief(new_belief)
+                agents[y].update_belief(new_belief)
+            return True
+
+        for x, y in pairs:
+            agent1, agent2 = agents[x], agents[y]
 
             if agent_type.__name__ in ["VoterAgent", "StochasticAgent", "CautiousAdventurousAgent"]:
                 new_belief = agent_type.consensus(
-                    agent1.belief, agent2.belief, random_instance
+                    agent1.belief, agent2.belief, fusion_random
                 )
             elif agent_type.__name__ in ["ErrorCorrectingAgent"]:
                 new_belief = None
@@ -174,36 +361,607 @@ def main_loop(
                 agent1.update_belief(new_belief)
                 agent2.update_belief(new_belief)
 
-            network_copy.remove_node(agent1)
-            network_copy.remove_node(agent2)
-
-    elif update_type == "Asymmetric":
-        for agent in network.nodes:
-            if random_instance.random() < fusion_prob:
-                try:
-                    broadcasting_agents = list(nx.node_connected_component(network, agent))
-                    agent.obtained_belief = random_instance.choice(broadcasting_agents).belief
-                except IndexError:
-                    continue
-            else:
-                agent.obtained_belief = None
-        for agent in network.nodes:
-            if agent.obtained_belief is not None:
+    elif update_type in ["Asymmetric", "Local"]:
+        if update_type == "Asymmetric" and components is None:
+            components = ComponentIndex(edges, len(agents))
+        elif update_type == "Local" and adjacency is None:
+            adjacency = Adjacency(edges, len(agents))
+        for a, agent in enumerate(agents):
+            agent.obtained_belief = None
+            if fusion_random.random() < fusion_prob:
+                # A copy, as the belief of an AgentView is a row of the population's
+                # beliefs, which the broadcaster may update before this agent does.
+                if update_type == "Asymmetric":
+                    broadcaster = components.choice(a, fusion_random)
+                    agent.obtained_belief = np.copy(agents[broadcaster].belief)
+                else:
+                    broadcaster = adjacency.choice(a, fusion_random)
+                    if broadcaster is not None:
+                        agent.obtained_belief = np.copy(agents[broadcaster].belief)
+        listeners = [agent for agent in agents if agent.obtained_belief is not None]
+        if issubclass(agent_type, ProbabilisticAgent) and len(listeners) > 0:
+            # Each listener fuses with a belief obtained before any agent updated,
+            # so every listener is fused at once.
+            new_beliefs = agent_type.fuse(
+                [agent.belief for agent in listeners],
+                [agent.obtained_belief for agent in listeners]
+            )
+            for agent, new_belief in zip(listeners, new_beliefs):
+                agent.update_belief(new_belief)
+        else:
+            for agent in listeners:
                 agent.update_belief(agent_type.consensus(agent.belief, agent.obtained_belief))
 
     return True
 
 
-def main():
+def population_loop(
+    states: int, population, edges, components, adjacency, rng, fusion_rng=None,
+    schedule=None, iteration=None
+):
     """
-    Main function for simulation experiments. Allows us to initiate start-up
-    separately from main loop, and to extract results from the main loop at
-    request. For example, the main_loop() will return FALSE when agents have
-    fully converged according to no. of interactions unchanged. Alternatively,
-    data can be processed for each iteration, or each test.
+    The population equivalent of main_loop(), in which evidential updating and
+    belief fusion are applied to all agents at once. `edges` is an (E, 2) array of
+    agent indices, and `components` and `adjacency` are the ComponentIndex and
+    Adjacency of the network. Fusion draws from the Generator `fusion_rng` if given.
+    If a scheduler.Schedule is given, only the agents it schedules for the given
+    iteration receive evidence and listen.
     """
 
-    # Parse the arguments of the program, e.g., agents, states, random init.
+    if fusion_rng is None:
+        fusion_rng = rng
+
+    if schedule is not None:
+        receiving = np.zeros(len(population), dtype=bool)
+        receiving[schedule.evidence.due(iteration)] = True
+    else:
+        receiving = rng.random(len(population)) <= evidence_rate
+    population.evidential_updating(receiving, noise_value, rng)
+
+    if population.steady_state():
+        return False
+    elif evidence_only:
+        return True
+
+    if update_type == "Symmetric":
+
+        if fusion_rate is not None:
+            num_of_edges = int(len(population) * (fusion_rate/100))
+        else:
+            num_of_edges = 1
+
+        pairs = random_matching(edges, len(population), num_of_edges, fusion_rng)
+        if len(pairs) == 0:
+            return True
+
+        agents1, agents2 = pairs[:, 0], pairs[:, 1]
+        beliefs2 = population.beliefs[agents2]
+        new_beliefs = population.consensus(population.beliefs[agents1], beliefs2, fusion_rng)
+        population.update_beliefs(agents1, new_beliefs)
+        if agent_type.__name__ in ["ErrorCorrectingAgent"]:
+            # As in main_loop(), the second agent fuses with the first agent's
+            # updated belief.
+            new_beliefs = population.consensus(beliefs2, new_beliefs, fusion_rng)
+        # Otherwise symmetric, so both agents adopt the combination belief.
+        population.update_beliefs(agents2, new_beliefs)
+
+    elif update_type in ["Asymmetric", "Local"]:
+        if schedule is not None:
+            listeners = np.sort(schedule.fusion.due(iteration))
+        else:
+            listeners = np.flatnonzero(fusion_rng.random(len(population)) < fusion_prob)
+        if update_type == "Asymmetric":
+            broadcasters = components.sample(listeners, fusion_rng)
+        else:
+            listeners, broadcasters = adjacency.sample(listeners, fusion_rng)
+        if len(listeners) > 0:
+            population.update_beliefs(listeners, population.consensus(
+                population.beliefs[listeners], population.beliefs[broadcasters], fusion_rng
+            ))
+
+    return True
+
+
+def batch_loop(
+    states: int, population, test_edges, components, adjacency, rng, fusion_rng
+):
+    """
+    The batch equivalent of population_loop(), which steps every active test of a
+    BatchPopulation at once. `test_edges` holds each test's (E, 2) edge array of
+    agent indices within the test, and `components` and `adjacency` cover the
+    agents of all tests. Returns a boolean mask of the active tests that have
+    reached a steady state.
+    """
+
+    num_of_agents = population.num_of_agents
+
+    receiving = population.active_agents() & (rng.random(len(population)) <= evidence_rate)
+    population.evidential_updating(receiving, noise_value, rng)
+
+    converged = population.active & population.steady_state()
+    if evidence_only:
+        return converged
+
+    fusing = population.active & ~converged
+
+    if update_type == "Symmetric":
+
+        if fusion_rate is not None:
+            num_of_edges = int(num_of_agents * (fusion_rate/100))
+        else:
+            num_of_edges = 1
+
+        # Matchings are drawn for each test separately, as each test selects the
+        # same number of pairs from its own network.
+        pairs = [
+            random_matching(test_edges[test], num_of_agents, num_of_edges, fusion_rng)
+            + test * num_of_agents
+            for test in np.flatnonzero(fusing)
+        ]
+        pairs = np.concatenate(pairs) if len(pairs) > 0 else np.zeros((0, 2), np.int32)
+        if len(pairs) == 0:
+            return converged
+
+        agents1, agents2 = pairs[:, 0], pairs[:, 1]
+        beliefs2 = population.beliefs[agents2]
+        new_beliefs = population.consensus(population.beliefs[agents1], beliefs2, fusion_rng)
+        population.update_beliefs(agents1, new_beliefs)
+        if agent_type.__name__ in ["ErrorCorrectingAgent"]:
+            new_beliefs = population.consensus(beliefs2, new_beliefs, fusion_rng)
+        population.update_beliefs(agents2, new_beliefs)
+
+    elif update_type in ["Asymmetric", "Local"]:
+        listening = np.repeat(fusing, num_of_agents) & \
+            (fusion_rng.random(len(population)) < fusion_prob)
+        listeners = np.flatnonzero(listening)
+        if update_type == "Asymmetric":
+            broadcasters = components.sample(listeners, fusion_rng)
+        else:
+            listeners, broadcasters = adjacency.sample(listeners, fusion_rng)
+        if len(listeners) > 0:
+            population.update_beliefs(listeners, population.consensus(
+                population.beliefs[listeners], population.beliefs[broadcasters], fusion_rng
+            ))
+
+    return converged
+
+
+def truth_values():
+    """ The truth values from which the true state of the world is drawn. """
+
+    if agent_type.__name__ in ["Agent", "ErrorCorrectingAgent"]:
+        return [-1,1]
+    # if agent_type.__name__ == "VoterAgent" or agent_type.__name__ == "ProbabilisticAgent":
+    return [0,1]
+
+
+def initial_beliefs(num_of_agents, states, rng):
+    """
+    The initial beliefs of a population engine, or None for the ignorant beliefs
+    of three-valued agents. Voter agents start with random beliefs, drawn from the
+    numpy Generator `rng`.
+    """
+
+    if agent_type.__name__ == "VoterAgent":
+        return rng.integers(0, 2, (num_of_agents, states), np.int8)
+
+    return None
+
+
+def compiled_loop(population, edges, components, adjacency):
+    """
+    The population_loop() of the Numba backend, which steps the population with
+    jit.step(), drawing from the random number generator of compiled code.
+    """
+
+    if fusion_rate is not None:
+        num_of_edges = int(len(population) * (fusion_rate/100))
+    else:
+        num_of_edges = 1
+
+    if adjacency is None:
+        indptr, indices = np.zeros(len(population) + 1, np.int64), np.zeros(0, np.int32)
+    else:
+        indptr, indices = np.asarray(adjacency.indptr), np.asarray(adjacency.indices)
+
+    running, population.unsettled, changes = jit.step(
+        population.beliefs, population.differences, population.evidence,
+        population.interactions, population.since_change, population.true_state,
+        population.unsettled, population.threshold,
+        jit.agent_codes[agent_type.__name__], jit.update_codes[update_type],
+        evidence_rate, noise_value, 1.0 if fusion_prob is None else fusion_prob,
+        num_of_edges, evidence_only, np.asarray(edges), components.members,
+        components.offsets, components.sizes, np.asarray(components.labels), indptr, indices
+    )
+    population.changes += changes
+
+    return running
+
+
+def fast_forwarding():
+    """
+    Check whether tests are simulated directly by evidence_only_losses(), which
+    requires true states of -1 and 1, i.e., Agent and ErrorCorrectingAgent.
+    """
+
+    return evidence_only and fast_forward and agent_type.__name__ in [
+        "Agent", "ErrorCorrectingAgent"
+    ]
+
+
+def run_test(test, arguments, streams, progress=None):
+    """
+    Run a single test: initialise a new network of agents and a true state of the
+    world, then run the main loop until the agents converge or the iteration limit
+    is reached. Randomness is drawn from the test's rng.Streams, and each iteration
+    is reported to `progress`, if given. Returns the [mean, std_dev, min, max] loss of the population for
+    each iteration up to and including the converged iteration, and the final loss
+    of each agent.
+    """
+
+    # Structure is [mean, std_dev, min, max]
+    loss_results = np.zeros((iteration_limit + 1, 4))
+    steady_state_results = np.zeros(arguments.agents)
+
+    if fast_forwarding():
+        losses = evidence_only_losses(
+            arguments.agents, arguments.states, evidence_rate, noise_value,
+            steady_state_threshold, iteration_limit, streams.generators()[0]
+        )
+        loss_results = np.stack([
+            np.average(losses, axis=1),
+            np.std(losses, axis=1),
+            np.min(losses, axis=1),
+            np.max(losses, axis=1)
+        ], axis=1)
+
+        # End the test at the first iteration meeting an early exit condition, as
+        # in the main loop below. Every piece of evidence revealing a proposition
+        # changes a loss, so beliefs changed in exactly those iterations in which
+        # any loss changed.
+        iterations = np.arange(1, len(losses))
+        exits = np.zeros(len(iterations), dtype=bool)
+        if early_exit_unchanged is not None:
+            changed = np.any(losses[1:] != losses[:-1], axis=1)
+            last_change = np.maximum.accumulate(np.where(changed, iterations, 0))
+            exits |= iterations - last_change >= early_exit_unchanged
+        if early_exit_plateau is not None and len(losses) > early_exit_plateau[0]:
+            plateau = np.abs(loss_results[early_exit_plateau[0]:, 0] - loss_results[:-early_exit_plateau[0], 0])
+            exits[early_exit_plateau[0] - 1:] |= plateau <= early_exit_plateau[1]
+        if exits.any():
+            last_iteration = iterations[np.argmax(exits)]
+            loss_results, losses = loss_results[:last_iteration + 1], losses[:last_iteration + 1]
+
+        return loss_results, losses[-1]
+
+
+    # True state of the world
+    true_state = np.array([streams.agents.choice(truth_values()) for x in range(arguments.states)])
+
+    # Initialise the agents and the environment.
+    # If we are to partition the space, we need to assign agents regions of the
+    # total grid space.
+    agents, topology = initialisation(
+        arguments.agents,
+        arguments.states,
+        arguments.connectivity,
+        arguments.knn,
+        arguments.m,
+        streams.topology,
+        objects=engine == "object",
+        seed=getattr(arguments, "seed", None),
+        test_seed=streams.seed_sequence,
+        true_state=true_state,
+        agent_random=streams.agents
+    )
+
+    # Reusable vector for loss values of population
+    loss_values = np.array([0.0 for x in range(arguments.agents)])
+
+    # Voter and probabilistic agents update their beliefs in place, so that their
+    # since_change counters cannot show which beliefs changed.
+    incremental_loss = agent_type.__name__ in [
+        "Agent", "StochasticAgent", "ErrorCorrectingAgent", "CautiousAdventurousAgent"
+    ]
+
+    # The network is fixed for the duration of a test, so label its connected
+    # components once rather than searching the graph for every agent.
+    edges = topology.edges
+    components = topology.components
+    adjacency = topology.adjacency if update_type == "Local" else None
+    rng, fusion_rng = streams.generators()
+
+    # Agents are indexed as in the edge array.
+    if engine == "population":
+        population = Population(
+            agent_type, arguments.agents, arguments.states, true_state, steady_state_threshold,
+            initial_beliefs(arguments.agents, arguments.states, rng)
+        )
+    elif engine == "packed":
+        population = PackedPopulation(
+            agent_type, arguments.agents, arguments.states, true_state, steady_state_threshold
+        )
+
+    schedule = None
+    if event_driven and engine in ["population", "packed"]:
+        scheduled_fusion = not evidence_only and update_type in ["Asymmetric", "Local"]
+        schedule = Schedule(
+            arguments.agents, evidence_rate, rng,
+            fusion_prob if scheduled_fusion else None, fusion_rng
+        )
+        # Symmetric fusion acts in every iteration, so no iteration can be skipped.
+        skip_idle = evidence_only or scheduled_fusion
+
+    # The compiled loop draws from its own generator, seeded from this test's.
+    compiled = numba_backend and jit.available and engine == "population" and schedule is None
+    if compiled:
+        jit.seed(int(rng.integers(2**31)))
+
+    # Pre-loop results based on agent initialisation.
+    if engine == "object":
+        for a, agent in enumerate(agents):
+            loss_values[a] = results.loss(agent_type, agent.belief, true_state)
+    else:
+        loss_values = population.loss()
+
+    loss_results[0] = [
+        np.average(loss_values),
+        np.std(loss_values),
+        np.min(loss_values),
+        np.max(loss_values)
+    ]
+
+    entropy_data = [0.0 for x in range(3)]
+    error_data = [0.0 for x in range(3)]
+
+    # print(loss_results[0][0])
+
+    # The number of consecutive iterations in which no agent's belief has changed.
+    unchanged_iterations = 0
+
+    # Main loop of the experiments. Starts at 1 because we have recorded the agents'
+    # initial state above, at the "0th" index.
+    for iteration in range(1, iteration_limit + 1):
+        if progress is not None:
+            progress.update(test, iteration)
+
+        if schedule is not None and skip_idle and schedule.idle(iteration):
+            # No agent acts, so every belief and loss is as it was.
+            running = True
+            changes = 0
+
+        elif engine in ["population", "packed"]:
+            if compiled:
+                running = compiled_loop(population, edges, components, adjacency)
+            else:
+                running = population_loop(
+                    arguments.states, population, edges, components, adjacency, rng,
+                    fusion_rng, schedule, iteration
+                )
+            loss_values = population.loss()
+            changes = population.changes
+            population.changes = 0
+
+        # While not converged, continue to run the main loop.
+        else:
+            updates = [agent.evidence + agent.interactions for agent in agents]
+            running = main_loop(
+                arguments.states, agents, edges, true_state, streams.agents,
+                entropy_data, error_data, components, adjacency, fusion_rng,
+                streams.fusion
+            )
+
+            # An agent's belief has changed this iteration only if it has been
+            # unchanged for fewer updates than it made, so only those losses are
+            # recomputed.
+            changes = 0
+            for a, agent in enumerate(agents):
+                if incremental_loss and \
+                    agent.since_change >= agent.evidence + agent.interactions - updates[a]:
+                    continue
+                changes += 1
+                loss_values[a] = results.loss(agent_type, agent.belief, true_state)
+
+        # If no belief has changed, neither has any loss.
+        if changes == 0:
+            loss_results[iteration] = loss_results[iteration - 1]
+        else:
+            loss_results[iteration] = [
+                np.average(loss_values),
+                np.std(loss_values),
+                np.min(loss_values),
+                np.max(loss_values)
+            ]
+        # print(loss_results[iteration][0])
+
+        # Optionally end the test once the population has reached a fixed point.
+        unchanged_iterations = unchanged_iterations + 1 if changes == 0 else 0
+        if early_exit_unchanged is not None and unchanged_iterations >= early_exit_unchanged:
+            running = False
+        if early_exit_plateau is not None and iteration >= early_exit_plateau[0]:
+            plateau = abs(loss_results[iteration][0] - loss_results[iteration - early_exit_plateau[0]][0])
+            if plateau <= early_exit_plateau[1]:
+                running = False
+
+        if iteration == iteration_limit or not running:
+            steady_state_results = np.copy(loss_values)
+
+        # If the simulation has converged, end the test.
+        if not running:
+            break
+
+    # print(np.average(steady_state_results))
+
+    return loss_results[:iteration + 1], steady_state_results
+
+
+def run_seeded_test(test, arguments, seed_sequence, progress=None):
+    """
+    Run a single test with its own random streams, derived from a numpy SeedSequence
+    so that tests can be run in any order, or in separate processes.
+    """
+
+    if legacy_random:
+        streams = Streams.shared(random.Random(
+            int.from_bytes(seed_sequence.generate_state(4).tobytes(), "little")
+        ))
+    else:
+        streams = Streams.spawn(seed_sequence)
+
+    return run_test(test, arguments, streams, progress)
+
+
+def run_batch(arguments, seeds, progress=None):
+    """
+    Run every test at once with the batch engine. Each test's network and true
+    state are drawn from its own streams, derived from its SeedSequence as in
+    run_seeded_test(), whereas evidence and fusion for all tests are drawn from a
+    pair of Generators derived from every test's SeedSequence. Tests leave the
+    batch as they converge. Returns, for each test, its loss trajectory and the
+    final loss of each agent, as run_test() does.
+    """
+
+    tests = len(seeds)
+    num_of_agents = arguments.agents
+
+    true_states = list()
+    test_topologies = list()
+    for seed_sequence in seeds:
+        streams = Streams.spawn(seed_sequence)
+        true_states.append([streams.agents.choice(truth_values()) for x in range(arguments.states)])
+        _, topology = initialisation(
+            num_of_agents,
+            arguments.states,
+            arguments.connectivity,
+            arguments.knn,
+            arguments.m,
+            streams.topology,
+            objects=False,
+            seed=getattr(arguments, "seed", None),
+            test_seed=seed_sequence
+        )
+        test_topologies.append(topology)
+
+    # The networks of all tests form one block-diagonal network, in which the
+    # components of each test are labelled after those of the tests before it.
+    test_edges = [topology.edges for topology in test_topologies]
+    label_offsets = np.cumsum(
+        [0] + [len(topology.components.sizes) for topology in test_topologies[:-1]]
+    )
+    components = ComponentIndex.from_labels(np.concatenate([
+        topology.components.labels + offset
+        for topology, offset in zip(test_topologies, label_offsets)
+    ]).astype(np.int32))
+    adjacency = None
+    if update_type == "Local":
+        adjacency = Adjacency(np.concatenate([
+            edges + test * num_of_agents for test, edges in enumerate(test_edges)
+        ]).astype(np.int32), tests * num_of_agents)
+
+    rng, fusion_rng = [
+        np.random.default_rng(child) for child in np.random.SeedSequence(
+            [int(seed_sequence.generate_state(1)[0]) for seed_sequence in seeds]
+        ).spawn(2)
+    ]
+
+    population = BatchPopulation(
+        agent_type, tests, num_of_agents, arguments.states, true_states, steady_state_threshold,
+        initial_beliefs(tests * num_of_agents, arguments.states, rng)
+    )
+
+    def statistics(losses):
+        return np.stack([
+            np.average(losses, axis=1),
+            np.std(losses, axis=1),
+            np.min(losses, axis=1),
+            np.max(losses, axis=1)
+        ], axis=1)
+
+    # Structure is [mean, std_dev, min, max]
+    loss_results = np.zeros((tests, iteration_limit + 1, 4))
+    steady_state_results = np.zeros((tests, num_of_agents))
+    final_iterations = np.full(tests, iteration_limit)
+    unchanged_iterations = np.zeros(tests, np.int64)
+
+    loss_results[:, 0] = statistics(population.loss())
+
+    for iteration in range(1, iteration_limit + 1):
+        if progress is not None:
+            progress.update_batch(iteration)
+
+        active = population.active.copy()
+        ending = batch_loop(
+            arguments.states, population, test_edges, components, adjacency, rng, fusion_rng
+        )
+        losses = population.loss()
+        changes = population.changes
+        population.changes = np.zeros(tests, np.int64)
+
+        # If no belief of a test has changed, neither has any of its losses.
+        changed = active & (changes > 0)
+        if changed.any():
+            loss_results[changed, iteration] = statistics(losses[changed])
+        unchanged = active & (changes == 0)
+        loss_results[unchanged, iteration] = loss_results[unchanged, iteration - 1]
+
+        # Optionally end tests once their populations have reached a fixed point.
+        unchanged_iterations = np.where(changes == 0, unchanged_iterations + 1, 0)
+        if early_exit_unchanged is not None:
+            ending |= active & (unchanged_iterations >= early_exit_unchanged)
+        if early_exit_plateau is not None and iteration >= early_exit_plateau[0]:
+            plateau = np.abs(
+                loss_results[:, iteration, 0] - loss_results[:, iteration - early_exit_plateau[0], 0]
+            )
+            ending |= active & (plateau <= early_exit_plateau[1])
+
+        if iteration == iteration_limit:
+            ending = active
+
+        for test in np.flatnonzero(ending):
+            steady_state_results[test] = losses[test]
+            final_iterations[test] = iteration
+            population.active[test] = False
+            if progress is not None:
+                progress.complete(test, iteration)
+
+        if not population.active.any():
+            break
+
+    return [
+        (loss_results[test, :final_iterations[test] + 1], steady_state_results[test])
+        for test in range(tests)
+    ]
+
+
+# The module-level settings that determine the behaviour of a test.
+setting_names = [
+    "tests", "iteration_limit", "fast_forward", "steady_state_threshold", "early_exit_unchanged",
+    "early_exit_plateau", "graph_type",
+    "evidence_only", "update_type", "fusion_rate", "fusion_prob", "evidence_rate",
+    "noise_value", "clique_size", "engine", "event_driven", "agent_views", "numba_backend", "loss_storage", "agent_type", "init_beliefs",
+    "connectivity_value", "k_nearest_neighbours", "m_value", "legacy_random",
+    "cache_topologies", "reuse_random_topologies", "native_random_graphs", "topology_directory"
+]
+
+
+def settings():
+    """ The current values of the module-level settings. """
+
+    return {name: globals()[name] for name in setting_names}
+
+
+def configure(values):
+    """
+    Apply module-level settings, e.g., in a worker process which may not have
+    inherited the settings of the parent process.
+    """
+
+    globals().update(values)
+
+
+def argument_parser():
+    """ The parser for the arguments of the program, e.g., agents, states, random init. """
+
     parser = argparse.ArgumentParser(description="Distributed decision-making\
         in a multi-agent environment in which agents must reach a consensus\
             about the true state of the world.")
@@ -214,7 +972,25 @@ def main():
     parser.add_argument("-k", "--knn", type=int, help="k nearest neighbours to which each node is connected.")
     parser.add_argument("-m", "--m", type=int, help="Number of edges to attach from a new node to existing nodes.")
     parser.add_argument("-r", "--random", action="store_true", help="Random seeding of the RNG.")
-    arguments = parser.parse_args()
+    parser.add_argument("-w", "--workers", type=int, help="Number of worker processes across which\
+        tests are run, each test with its own RNG derived from the master seed.")
+    parser.add_argument("-f", "--force", action="store_true", help="Rerun the experiments even if\
+        results for an identical configuration already exist.")
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Main function for simulation experiments. Allows us to initiate start-up
+    separately from main loop, and to extract results from the main loop at
+    request. For example, the main_loop() will return FALSE when agents have
+    fully converged according to no. of interactions unchanged. Alternatively,
+    data can be processed for each iteration, or each test.
+    """
+
+    # Parse the arguments of the program, e.g., agents, states, random init.
+    arguments = argument_parser().parse_args(argv)
 
     if arguments.connectivity is None and connectivity_value is not None:
         arguments.connectivity = connectivity_value
@@ -231,10 +1007,10 @@ def main():
         print("Usage error: Connectivity must be specified for node-only graph.")
         sys.exit(0)
 
-    # Create an instance of a RNG that is either seeded for consistency of simulation
-    # results, or create using a random seed for further testing.
-    random_instance = random.Random()
-    random_instance.seed(128) if arguments.random == False else random_instance.seed()
+    # The master seed is either fixed for consistency of simulation results, or
+    # random for further testing.
+    seed = 128 if arguments.random == False else None
+    arguments.seed = seed
 
     # Output variables
     directory = "../results/test_results/sotw-network-temp/{}/".format(agent_type.__name__.lower())
@@ -251,124 +1027,13 @@ def main():
         param_strings += ["m: {}".format(arguments.m)]
     if update_type == "Symmetric":
         param_strings += ["Fusion rate: {}".format(fusion_rate)]
-    elif update_type == "Asymmetric":
+    elif update_type in ["Asymmetric", "Local"]:
         param_strings += ["Fusion prob: {}".format(fusion_prob)]
     param_strings += ["Evidence rate: {}".format(evidence_rate)]
     param_strings += ["Noise value: {}".format(noise_value)]
     print("    ".join(param_strings))
 
-    # Structure is [mean, std_dev, min, max]
-    loss_results = np.array([
-        [[0.0 for x in range(4)] for y in range(tests)] for z in range(iteration_limit + 1)
-    ])
-    # Structure is [combined_info_gain, evidence_info_gain, consensus_info_gain]
-    entropy_results = np.array([
-        [[0.0 for x in range(3)] for y in range(tests)] for z in range(iteration_limit)
-    ])
-    # Structure is [combined_error, evidence_error, consensus_error]
-    error_results = np.array([
-        [[0.0 for x in range(3)] for y in range(tests)] for z in range(iteration_limit)
-    ])
-    steady_state_results = np.array([
-        [0.0 for x in range(arguments.agents)] for y in range(tests)
-    ])
-
-    # Repeat the initialisation and loop for the number of simulation runs required
-    max_iteration = 0
-    for test in range(tests):
-
-        # True state of the world
-        if agent_type.__name__ in ["Agent", "ErrorCorrectingAgent"]:
-            true_state = np.array([random_instance.choice([-1,1]) for x in range(arguments.states)])
-        # if agent_type.__name__ == "VoterAgent" or agent_type.__name__ == "ProbabilisticAgent":
-        else:
-            true_state = np.array([random_instance.choice([0,1]) for x in range(arguments.states)])
-
-        network = nx.Graph()
-
-        # Initialise the agents and the environment.
-        # If we are to partition the space, we need to assign agents regions of the
-        # total grid space.
-        initialisation(
-            arguments.agents,
-            arguments.states,
-            network,
-            arguments.connectivity,
-            arguments.knn,
-            arguments.m,
-            random_instance
-        )
-
-        # Reusable vector for loss values of population
-        loss_values = np.array([0.0 for x in range(arguments.agents)])
-
-        # Pre-loop results based on agent initialisation.
-        for a, agent in enumerate(network.nodes):
-            loss_values[a] = results.loss(agent_type, agent.belief, true_state)
-
-        loss_results[0][test] = [
-            np.average(loss_values),
-            np.std(loss_values),
-            np.min(loss_values),
-            np.max(loss_values)
-        ]
-
-        entropy_data = [0.0 for x in range(3)]
-        error_data = [0.0 for x in range(3)]
-
-        # print(loss_results[0][test][0])
-
-        # Main loop of the experiments. Starts at 1 because we have recorded the agents'
-        # initial state above, at the "0th" index.
-        for iteration in range(1, iteration_limit + 1):
-            print("Test #{} - Iteration #{}    ".format(test + 1, iteration), end="\r")
-
-            max_iteration = iteration if iteration > max_iteration else max_iteration
-            # While not converged, continue to run the main loop.
-            if main_loop(
-                arguments.states, network, true_state, random_instance,
-                entropy_data, error_data
-            ):
-                for a, agent in enumerate(network.nodes):
-                    loss = results.loss(agent_type, agent.belief, true_state)
-                    loss_values[a] = loss
-                    if iteration == iteration_limit:
-                        steady_state_results[test][a] = loss
-
-                loss_results[iteration][test] = [
-                    np.average(loss_values),
-                    np.std(loss_values),
-                    np.min(loss_values),
-                    np.max(loss_values)
-                ]
-                # print(loss_results[iteration][test][0])
-
-            # If the simulation has converged, end the test.
-            else:
-                for a, agent in enumerate(network.nodes):
-                    loss = results.loss(agent_type, agent.belief, true_state)
-                    loss_values[a] = loss
-                    # loss_results[iteration][test] += loss
-                    steady_state_results[test][a] = loss
-
-                loss_results[iteration][test] = [
-                    np.average(loss_values),
-                    np.std(loss_values),
-                    np.min(loss_values),
-                    np.max(loss_values)
-                ]
-
-                for iter in range(iteration + 1, iteration_limit + 1):
-                    loss_results[iter][test] = np.copy(loss_results[iteration][test])
-                # Simulation has converged, so break main loop.
-                break
-
-        # print(np.average(steady_state_results[test]))
-
-        # Reset the static identity for the Agent class.
-        agent_type.identity = 0
-
-    # Recording of results. First, add parameters in sequence.
+    # Names of the result files. First, add parameters in sequence.
 
     file_name_params.append("{}s".format(arguments.states))
     file_name_params.append("{}a".format(arguments.agents))
@@ -394,17 +1059,112 @@ def main():
     if update_type == "Symmetric":
         if fusion_rate is not None:
             file_name_params.append("{}fr".format(fusion_rate))
-    elif update_type == "Asymmetric":
+    elif update_type in ["Asymmetric", "Local"]:
         if fusion_prob is not None:
             file_name_params.append("{:.3f}fp".format(fusion_prob))
+        if update_type == "Local":
+            file_name_params.append("local")
 
     if evidence_only:
         file_name_params.append("eo")
 
+    loss_file = directory + "loss" + '_' + '_'.join(file_name_params) + '.pkl.xz'
+    steady_state_file = directory + "steady_state_loss" + '_' + '_'.join(file_name_params) + '.pkl.xz'
+    output_files = [steady_state_file]
+    if arguments.agents in trajectory_populations:
+        output_files.append(loss_file)
+
+    # Every parameter that affects the results of this configuration. Results with a
+    # random seed are never reused.
+    parameters = settings()
+    for name in ["connectivity_value", "k_nearest_neighbours", "m_value", "topology_directory"]:
+        del parameters[name]
+    parameters.update({
+        "agent_type": agent_type.__name__, "init_beliefs": init_beliefs.__qualname__,
+        "states": arguments.states, "agents": arguments.agents,
+        "connectivity": arguments.connectivity, "knn": arguments.knn, "m": arguments.m,
+        "seed": 128,
+        "per_test_seeds": not legacy_random or arguments.workers is not None or engine == "batch",
+        # The Numba backend is only used where it is installed.
+        "numba_backend": numba_backend and jit.available,
+        "code_version": cache.code_version()
+    })
+    result_cache = cache.ResultCache(directory)
+    key = None
+    if use_cache and not arguments.random and not arguments.force:
+        key = cache.configuration_key(parameters)
+        if result_cache.complete(key, output_files):
+            print("Results already exist for this configuration, skipping.")
+            return
+
+    # Structure is [mean, std_dev, min, max]
+    if loss_storage == "streaming":
+        loss_results = results.LossTrajectories(tests, iteration_limit)
+    else:
+        loss_results = np.zeros((iteration_limit + 1, tests, 4))
+    steady_state_results = np.zeros((tests, arguments.agents))
+
+    def record(test, trajectory):
+        """ Record a test's loss trajectory, which ends once the test converged. """
+
+        if loss_storage == "streaming":
+            loss_results.record(test, trajectory)
+        else:
+            loss_results[:len(trajectory), test] = trajectory
+            loss_results[len(trajectory):, test] = trajectory[-1]
+
+    if numba_backend and not jit.available and engine == "population":
+        print("Numba is not installed: using the NumPy population engine.")
+
+    progress = Progress(tests, iteration_limit)
+
+    # Repeat the initialisation and loop for the number of simulation runs required
+    if engine == "batch" and not fast_forwarding():
+        # Every test is stepped at once, in this process.
+        for test, (trajectory, test_steady_state) in enumerate(
+            run_batch(arguments, test_seeds(seed, tests), progress)
+        ):
+            record(test, trajectory)
+            steady_state_results[test] = test_steady_state
+    elif legacy_random and arguments.workers is None:
+        # Every test draws in turn from a single random.Random.
+        random_instance = random.Random()
+        random_instance.seed(seed)
+        for test in range(tests):
+            trajectory, steady_state_results[test] = run_test(
+                test, arguments, Streams.shared(random_instance), progress
+            )
+            record(test, trajectory)
+            progress.complete(test, len(trajectory) - 1)
+    elif arguments.workers is None:
+        for test, seed_sequence in enumerate(test_seeds(seed, tests)):
+            trajectory, steady_state_results[test] = run_seeded_test(
+                test, arguments, seed_sequence, progress
+            )
+            record(test, trajectory)
+            progress.complete(test, len(trajectory) - 1)
+    else:
+        # Tests are independent, so each is given its own streams derived from the
+        # master seed, and the results do not depend on the worker count.
+        seeds = test_seeds(seed, tests)
+        with ProcessPoolExecutor(
+            max_workers=arguments.workers, initializer=configure,
+            initargs=(settings(),)
+        ) as executor:
+            test_results = executor.map(
+                run_seeded_test, range(tests), [arguments] * tests, seeds
+            )
+            for test, (trajectory, test_steady_state) in enumerate(test_results):
+                record(test, trajectory)
+                steady_state_results[test] = test_steady_state
+                progress.complete(test, len(trajectory) - 1)
+
     # Write loss results to pickle file
     if arguments.agents in trajectory_populations:
-        with lzma.open(directory + "loss" + '_' + '_'.join(file_name_params) + '.pkl.xz', 'wb') as file:
-            pickle.dump(loss_results, file)
+        if loss_storage == "streaming":
+            cache.write_pickle(loss_file, loss_results.data())
+        else:
+            cache.write_pickle(loss_file, loss_results)
 
     # results.write_to_file(
     #     directory,
@@ -414,13 +1174,101 @@ def main():
     #     tests
     # )
 
-    with lzma.open(directory + "steady_state_loss" + '_' + '_'.join(file_name_params) + '.pkl.xz', 'wb') as file:
-        pickle.dump(steady_state_results, file)
+    cache.write_pickle(steady_state_file, steady_state_results)
+
+    # Only now that every result file is written is the configuration complete.
+    if key is not None:
+        result_cache.record(key, parameters, output_files)
+
+def expand(grid):
+    """
+    Expand a parameter grid, mapping setting names to lists of values, into the
+    list of configurations (dictionaries of settings) that it declares. The last
+    setting in the grid varies fastest.
+    """
+
+    names = list(grid)
+
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*[grid[name] for name in names])
+    ]
+
+
+def estimated_cost(configuration, argv):
+    """
+    A rough estimate of the running time of a configuration: tests converge in a
+    number of iterations that grows with the number of states and the inverse of
+    the evidence rate, and each iteration costs time in proportion to the agents.
+    """
+
+    arguments = argument_parser().parse_args(argv)
+    rate = configuration.get("evidence_rate", evidence_rate)
+    iterations = min(iteration_limit, arguments.states / rate if rate > 0 else iteration_limit)
+
+    return configuration.get("tests", tests) * arguments.agents * iterations
+
+
+def run_configuration(configuration, argv):
+    """ Apply a configuration's settings, then run its experiments. """
+
+    configure(configuration)
+    main(argv)
+
+
+def sweep(grid, argv=None, workers=None):
+    """
+    Run main() for every configuration of a parameter grid across a pool of
+    `workers` processes (all processors by default), starting the longest
+    running configurations first so that no long job is left until the end.
+    """
+
+    argv = sys.argv[1:] if argv is None else argv
+    configurations = sorted(
+        expand(grid), key=lambda x: estimated_cost(x, argv), reverse=True
+    )
+
+    if workers == 1:
+        for configuration in configurations:
+            run_configuration(configuration, argv)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=configure, initargs=(settings(),)
+    ) as executor:
+        jobs = [
+            executor.submit(run_configuration, configuration, argv)
+            for configuration in configurations
+        ]
+        for job in jobs:
+            job.result()
+
 
 if __name__ == "__main__":
 
-    # "standard" | "evidence" | "noise" | "en" | "ce" | "cen" | "kce"
+    # "standard" | "evidence" | "noise" | "en" | "ce" | "cen" | "kce" | "me"
     test_set = "en"
+    # Number of processes across which a sweep is run: None uses all processors.
+    sweep_workers = None
+
+    # The parameter grid swept by each test set.
+    test_sets = {
+        "evidence": {"evidence_rate": evidence_rates},
+        "noise": {"noise_value": noise_values},
+        "en": {"evidence_rate": evidence_rates, "noise_value": noise_values},
+        "ce": {"connectivity_value": connectivity_values, "evidence_rate": evidence_rates},
+        "cen": {
+            "connectivity_value": connectivity_values,
+            "evidence_rate": evidence_rates,
+            "noise_value": noise_values
+        },
+        "kce": {
+            "k_nearest_neighbours": knn_values,
+            "connectivity_value": connectivity_values,
+            "evidence_rate": evidence_rates
+        },
+        "me": {"m_value": m_values, "evidence_rate": evidence_rates},
+    }
 
     if test_set == "standard":
 
@@ -441,65 +1289,5 @@ if __name__ == "__main__":
         # print(s.getvalue())
         # END
 
-    elif test_set == "evidence":
-
-        for er in evidence_rates:
-            evidence_rate = er
-            main()
-
-    elif test_set == "noise":
-
-        for nv in noise_values:
-            noise_value = nv
-            main()
-
-    elif test_set == "en":
-
-        for er in evidence_rates:
-            evidence_rate = er
-
-            for nv in noise_values:
-                noise_value = nv
-                main()
-
-    elif test_set == "ce":
-
-        for con in connectivity_values:
-            connectivity_value = con
-
-            for er in evidence_rates:
-                evidence_rate = er
-                main()
-
-    elif test_set == "cen":
-
-        for con in connectivity_values:
-            connectivity_value = con
-
-            for er in evidence_rates:
-                evidence_rate = er
-
-                for nv in noise_values:
-                    noise_value = nv
-                    main()
-
-    elif test_set == "kce":
-
-        for knn in knn_values:
-            k_nearest_neighbours = knn
-
-            for con in connectivity_values:
-                connectivity_value = con
-
-                for er in evidence_rates:
-                    evidence_rate = er
-                    main()
-
-    elif test_set == "me":
-
-        for m in m_values:
-            m_value = m
-
-            for er in evidence_rates:
-                evidence_rate = er
-                main()
\ No newline at end of file
+    else:
+        sweep(test_sets[test_set], workers=sweep_workers)